@@ -29,6 +29,9 @@ def make_bibliography(aux_filename,
         output_encoding=None,
         output_backend=None,
         min_crossrefs=2,
+        parse_cache=False,
+        bib_index=False,
+        resync_at_line_start=False,
         **kwargs
         ):
     """This functions extracts all nessessary information from .aux file
@@ -36,33 +39,41 @@ def make_bibliography(aux_filename,
     """
 
     from os import path
-    from pybtex import auxfile
+    from pybtex import auxfile, errors
     from pybtex.plugin import find_plugin
     from pybtex.style import FormattedBibliography
 
     filename = path.splitext(aux_filename)[0]
     aux_data = auxfile.parse_file(aux_filename, output_encoding)
 
-    output_backend = find_plugin('pybtex.backends', output_backend)
-    bib_parser = find_plugin('pybtex.database.input', bib_format)
-    bib_data = bib_parser(
-        encoding=bib_encoding,
-        wanted_entries=aux_data.citations,
-        min_crossrefs=min_crossrefs,
-    ).parse_files(aux_data.data, bib_parser.get_default_suffix())
+    # warnings are printed together after the bibliography is written
+    with errors.collect() as error_report:
+        try:
+            output_backend = find_plugin('pybtex.backends', output_backend)
+            bib_parser = find_plugin('pybtex.database.input', bib_format)
+            bib_data = bib_parser(
+                encoding=bib_encoding,
+                wanted_entries=aux_data.citations,
+                min_crossrefs=min_crossrefs,
+                cache=parse_cache,
+                index=bib_index,
+                resync_at_line_start=resync_at_line_start,
+            ).parse_files(aux_data.data, bib_parser.get_default_suffix())
 
-    style_cls = find_plugin('pybtex.style.formatting', aux_data.style)
-    style = style_cls(
-            label_style=kwargs.get('label_style'),
-            name_style=kwargs.get('name_style'),
-            sorting_style=kwargs.get('sorting_style'),
-            abbreviate_names=kwargs.get('abbreviate_names'),
-    )
-    citations = bib_data.add_extra_citations(aux_data.citations, min_crossrefs)
-    entries = (bib_data.entries[key] for key in citations)
-    formatted_entries = style.format_entries(entries)
-    del entries
-    formatted_bibliography = FormattedBibliography(formatted_entries, style)
+            style_cls = find_plugin('pybtex.style.formatting', aux_data.style)
+            style = style_cls(
+                    label_style=kwargs.get('label_style'),
+                    name_style=kwargs.get('name_style'),
+                    sorting_style=kwargs.get('sorting_style'),
+                    abbreviate_names=kwargs.get('abbreviate_names'),
+            )
+            citations = bib_data.add_extra_citations(aux_data.citations, min_crossrefs)
+            entries = (bib_data.entries[key] for key in citations)
+            formatted_entries = style.format_entries(entries)
+            del entries
+            formatted_bibliography = FormattedBibliography(formatted_entries, style)
 
-    output_filename = filename + output_backend.get_default_suffix()
-    output_backend(output_encoding).write_to_file(formatted_bibliography, output_filename)
+            output_filename = filename + output_backend.get_default_suffix()
+            output_backend(output_encoding).write_to_file(formatted_bibliography, output_filename)
+        finally:
+            error_report.print_report()
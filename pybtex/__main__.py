@@ -36,8 +36,8 @@ Pybtex reads citation information from a LaTeX .aux file and produces a
 formatted bibliography. Pybtex understands BibTeX .bib and .bst style files and
 can be used as a drop-in replacement for BibTeX.
 
-Besides BibTeX .bib files, BibTeXML and YAML bibliography files are
-supported.
+Besides BibTeX .bib files, BibTeXML, YAML and binary .bibbin bibliography
+files are supported.
 
 It is also possible to define bibliography formatting styles in Python.
 
@@ -75,6 +75,22 @@ It is also possible to define bibliography formatting styles in Python.
                 help='style definition language to use (bibtex or python)',
                 metavar='LANGUAGE',
             ),
+            make_option(
+                '--parse-cache', dest='parse_cache', action='store_true',
+                help='cache parsed bibliography and style files on disk (in $PYBTEX_CACHE_DIR or ~/.cache/pybtex)',
+            ),
+            make_option(
+                '--no-parse-cache', dest='parse_cache', action='store_false',
+                help='do not use the parse cache (default)',
+            ),
+            make_option(
+                '--bib-index', dest='bib_index', action='store_true',
+                help='store an index next to each .bib file and parse only the cited entries',
+            ),
+            make_option(
+                '--resync-at-line-start', dest='resync_at_line_start', action='store_true',
+                help='after a syntax error in a .bib file, skip to the next @ at the beginning of a line',
+            ),
         )),
         ('Pythonic style options', (
             make_option(
@@ -117,6 +133,9 @@ It is also possible to define bibliography formatting styles in Python.
     option_defaults = {
         'style_language': 'bibtex',
         'min_crossrefs': 2,
+        'parse_cache': False,
+        'bib_index': False,
+        'resync_at_line_start': False,
     }
     legacy_options = '-help', '-version', '-min-crossrefs', '-terse'
 
@@ -29,6 +29,11 @@ def make_bibliography(aux_filename,
         output_encoding=None,
         bst_encoding=None,
         min_crossrefs=2,
+        parse_cache=False,
+        bib_index=False,
+        compile_functions=True,
+        processes=None,
+        resync_at_line_start=False,
         **kwargs
     ):
 
@@ -37,17 +42,36 @@ def make_bibliography(aux_filename,
     import pybtex.io
     from pybtex.bibtex import bst
     from pybtex.bibtex.interpreter import Interpreter
-    from pybtex import auxfile
+    from pybtex.bibtex.compiler import CodeCache
+    from pybtex import auxfile, errors
 
 
     if bib_format is None:
         from pybtex.database.input.bibtex import Parser as bib_format
     aux_data = auxfile.parse_file(aux_filename, output_encoding)
     bst_filename = aux_data.style + path.extsep + 'bst'
-    bst_script = bst.parse_file(bst_filename, bst_encoding)
+    if parse_cache is True:
+        from pybtex.cache import FileCache
+        parse_cache = FileCache()
+    bst_script = bst.parse_file(bst_filename, bst_encoding, cache=parse_cache)
     base_filename = path.splitext(aux_filename)[0]
     bbl_filename = base_filename + path.extsep + 'bbl'
     bib_filenames = [filename + bib_format.get_default_suffix() for filename in aux_data.data]
     bbl_file = pybtex.io.open_unicode(bbl_filename, 'w', encoding=output_encoding)
-    interpreter = Interpreter(bib_format, bib_encoding)
-    interpreter.run(bst_script, aux_data.citations, bib_filenames, bbl_file, min_crossrefs=min_crossrefs)
+    interpreter = Interpreter(bib_format, bib_encoding,
+        parser_options={
+            'cache': parse_cache,
+            'index': bib_index,
+            'processes': processes,
+            'resync_at_line_start': resync_at_line_start,
+        },
+        compile_functions=compile_functions,
+        processes=processes,
+        code_cache=CodeCache(parse_cache) if parse_cache else None,
+    )
+    # warnings are printed together after the bibliography is written
+    with errors.collect() as error_report:
+        try:
+            interpreter.run(bst_script, aux_data.citations, bib_filenames, bbl_file, min_crossrefs=min_crossrefs)
+        finally:
+            error_report.print_report()
@@ -0,0 +1,240 @@
+# Copyright (c) 2012  Andrey Golovizin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Static analysis of BibTeX functions.
+
+ITERATE and REVERSE run a function for each entry in turn. If the
+function only touches the current entry, the entries can be processed in
+any order, e.g. in parallel. This module checks that:
+
+- the function does not write output, print anything, or call other
+  functions dynamically (with call.type$ or with computed function
+  arguments to if$, while$, and :=);
+- every global variable that may be changed by the function is assigned
+  before being read, so that no values are passed from one entry to the
+  next. Such variables are just scratch space, like s and t in plain.bst.
+
+Reading fields and entry variables, assigning entry variables, and
+reading global variables that are not changed is allowed. So is warning$,
+as the warnings are replayed in the original order.
+
+>>> from pybtex.bibtex.interpreter import (Interpreter, Identifier,
+...     QuotedVar, String, FunctionLiteral)
+>>> interpreter = Interpreter(None, None)
+>>> interpreter.command_entry([Identifier('title')], [], [Identifier('label')])
+>>> interpreter.command_strings([Identifier('s'), Identifier('last')])
+>>> interpreter.command_function([Identifier('calc.label')], [
+...     Identifier('title'), QuotedVar('s'), Identifier(':='),
+...     Identifier('s'), Identifier('empty$'),
+...     FunctionLiteral([String('?')]), FunctionLiteral([Identifier('s')]),
+...     Identifier('if$'), QuotedVar('label'), Identifier(':='),
+... ])
+>>> interpreter.command_function([Identifier('forward.pass')], [
+...     Identifier('last'), QuotedVar('label'), Identifier(':='),
+...     Identifier('title'), QuotedVar('last'), Identifier(':='),
+... ])
+>>> interpreter.command_function([Identifier('output')], [
+...     Identifier('label'), Identifier('write$'),
+... ])
+>>> analyzer = Analyzer(interpreter.vars)
+>>> analyzer.is_entry_local(interpreter.vars['calc.label'])
+True
+>>> sorted(analyzer.analyze(interpreter.vars['calc.label']).may_write)
+['s']
+>>> analyzer.is_entry_local(interpreter.vars['forward.pass'])
+False
+>>> analyzer.is_entry_local(interpreter.vars['output'])
+False
+
+"""
+
+from pybtex.bibtex.builtins import builtins, Builtin
+from pybtex.bibtex.interpreter import (
+    Function, FunctionLiteral, Identifier, QuotedVar,
+    Integer, String, EntryVariable, Field,
+)
+
+
+# built-in functions with side effects other than on the current entry
+# (if$, while$ and := are only allowed in the patterns handled below)
+unsafe_builtins = set(builtins[name] for name in (
+    ':=', 'call.type$', 'if$', 'newline$', 'stack$', 'top$', 'while$', 'write$',
+))
+
+
+class UnsafeFunction(Exception):
+    pass
+
+
+class Summary(object):
+    """Effects of a piece of code on global variables.
+
+    reads are the variables that may be read before being assigned,
+    must_write are the variables that are always assigned, and may_write
+    are the variables that may be assigned.
+    """
+
+    def __init__(self):
+        self.reads = set()
+        self.must_write = set()
+        self.may_write = set()
+
+    def add(self, other):
+        """Add the effects of the code executed after this code."""
+        self.reads |= other.reads - self.must_write
+        self.must_write |= other.must_write
+        self.may_write |= other.may_write
+
+    def add_branches(self, summary1, summary2):
+        """Add the effects of executing one of two pieces of code."""
+        self.reads |= (summary1.reads | summary2.reads) - self.must_write
+        self.must_write |= summary1.must_write & summary2.must_write
+        self.may_write |= summary1.may_write | summary2.may_write
+
+    def add_loop(self, condition, body):
+        self.add(condition)
+        self.reads |= body.reads - self.must_write
+        self.may_write |= body.may_write
+
+
+class Analyzer(object):
+    def __init__(self, vars):
+        self.vars = vars
+        self.summaries = {}
+        self.in_progress = set()
+
+    def is_entry_local(self, function):
+        """Return True if the function only changes the current entry."""
+        if not isinstance(function, Function):
+            return False
+        try:
+            summary = self.analyze(function)
+        except UnsafeFunction:
+            return False
+        return not (summary.reads & summary.may_write)
+
+    def analyze(self, function):
+        """Return the Summary of a function, or raise UnsafeFunction."""
+        key = id(function)
+        try:
+            summary = self.summaries[key]
+        except KeyError:
+            pass
+        else:
+            if summary is None:
+                raise UnsafeFunction
+            return summary
+        if key in self.in_progress:
+            raise UnsafeFunction  # recursion
+        self.in_progress.add(key)
+        try:
+            summary = self.analyze_body(function.body)
+        except UnsafeFunction:
+            self.summaries[key] = None
+            raise
+        finally:
+            self.in_progress.discard(key)
+        self.summaries[key] = summary
+        return summary
+
+    def is_builtin(self, element, name):
+        return (
+            type(element) is Identifier
+            and self.vars.get(element.value()) is builtins[name]
+        )
+
+    def is_branch(self, element):
+        return type(element) in (FunctionLiteral, QuotedVar)
+
+    def analyze_body(self, body):
+        summary = Summary()
+        pos = 0
+        while pos < len(body):
+            element = body[pos]
+            next_elements = body[pos + 1:pos + 3]
+            if (
+                len(next_elements) == 2
+                and self.is_branch(element)
+                and self.is_branch(next_elements[0])
+                and (
+                    self.is_builtin(next_elements[1], 'if$')
+                    or self.is_builtin(next_elements[1], 'while$')
+                )
+            ):
+                summary1 = self.analyze_branch(element)
+                summary2 = self.analyze_branch(next_elements[0])
+                if self.is_builtin(next_elements[1], 'if$'):
+                    summary.add_branches(summary1, summary2)
+                else:
+                    summary.add_loop(summary1, summary2)
+                pos += 3
+            elif (
+                type(element) is QuotedVar
+                and next_elements
+                and self.is_builtin(next_elements[0], ':=')
+            ):
+                self.analyze_assignment(element.value(), summary)
+                pos += 2
+            else:
+                self.analyze_element(element, summary)
+                pos += 1
+        return summary
+
+    def analyze_branch(self, element):
+        if type(element) is FunctionLiteral:
+            return self.analyze_body(element.body)
+        else:
+            summary = Summary()
+            self.analyze_call(element.value(), summary)
+            return summary
+
+    def analyze_assignment(self, name, summary):
+        variable = self.vars.get(name)
+        if type(variable) in (Integer, String):
+            summary.must_write.add(name)
+            summary.may_write.add(name)
+        elif not isinstance(variable, EntryVariable):
+            raise UnsafeFunction
+
+    def analyze_element(self, element, summary):
+        element_type = type(element)
+        if element_type in (Integer, String):
+            pass  # literals
+        elif element_type is Identifier:
+            self.analyze_call(element.value(), summary)
+        else:
+            # function literals and quoted names used in other ways
+            raise UnsafeFunction
+
+    def analyze_call(self, name, summary):
+        value = self.vars.get(name)
+        if type(value) in (Integer, String):
+            if name not in summary.must_write:
+                summary.reads.add(name)
+        elif isinstance(value, (EntryVariable, Field)):
+            pass
+        elif isinstance(value, Builtin):
+            if value in unsafe_builtins:
+                raise UnsafeFunction
+        elif isinstance(value, Function):
+            summary.add(self.analyze(value))
+        else:
+            raise UnsafeFunction
@@ -19,6 +19,9 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from __future__ import with_statement
+
+import io
 import re
 from pybtex.bibtex.interpreter import (Integer, String, QuotedVar,
         Identifier, FunctionLiteral, BibTeXError)
@@ -139,11 +142,36 @@ class BstParser(Scanner):
             yield list(self.parse_group())
 
 
-def parse_file(filename, encoding=None):
+def parse_file(filename, encoding=None, cache=None):
+    """Parse a .bst file and return the list of commands.
+
+    If cache is True, parsed files are stored in the default on-disk
+    cache (see pybtex.cache). A FileCache object may be passed instead.
+    """
+    if cache:
+        return parse_file_cached(filename, encoding, cache)
     bst_file = pybtex.io.open_unicode(filename, encoding=encoding)
     return parse_stream(bst_file, filename)
 
 
+def parse_file_cached(filename, encoding, cache):
+    from pybtex.cache import FileCache, get_content_hash
+
+    if cache is True:
+        cache = FileCache()
+    if encoding is None:
+        encoding = pybtex.io.get_default_encoding()
+    with pybtex.io.open_raw(filename) as bst_file:
+        content = bst_file.read()
+    key = ('pybtex.bibtex.bst', get_content_hash(content), encoding)
+    commands = cache.load(key)
+    if commands is None:
+        text = content.decode(encoding)
+        commands = parse_stream(io.StringIO(text, newline=None), filename)
+        cache.save(key, commands)
+    return commands
+
+
 def parse_stream(stream, filename='<INPUT>'):
     bst = '\n'.join(strip_comment(line.rstrip()) for line in stream)
     return list(BstParser(bst, filename=filename).parse())
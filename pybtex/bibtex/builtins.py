@@ -22,8 +22,15 @@
 """Built-in functions for BibTeX interpreter.
 
 CAUTION: functions should PUSH results, not RETURN
+
+Built-in functions pop their arguments from interpreter.stack directly.
+Popping from an empty stack raises IndexError, which is turned into
+BibTeXError by Builtin.execute (and by compiled functions, see
+pybtex.bibtex.compiler). Other IndexErrors are passed through (see
+is_stack_underflow()).
 """
 
+import sys
 from functools import update_wrapper
 
 
@@ -40,11 +47,37 @@ def print_warning(msg):
     report_error(BibTeXError(msg))
 
 
+# code objects of the built-in functions, see is_stack_underflow()
+builtin_code = set()
+
+
+def is_stack_underflow(error, traceback):
+    """Check if an IndexError was raised by popping from (or indexing) an
+    empty list in the frame of the traceback, or in a built-in function
+    called directly from there, and not in some other function.
+
+    Built-in and compiled functions do not pop or index any lists other
+    than the stack, so this is a stack underflow.
+    """
+    if str(error) not in ('pop from empty list', 'list index out of range'):
+        return False
+    inner = traceback.tb_next
+    return inner is None or (
+        inner.tb_next is None and inner.tb_frame.f_code in builtin_code
+    )
+
+
 class Builtin(object):
     def __init__(self, f):
         self.f = f
+        builtin_code.add(f.__code__)
     def execute(self, interpreter):
-        self.f(interpreter)
+        try:
+            self.f(interpreter)
+        except IndexError, error:
+            if interpreter.stack or not is_stack_underflow(error, sys.exc_info()[2]):
+                raise
+            raise BibTeXError('pop from empty stack')
     def __repr__(self):
         return '<builtin %s>' % self.f.__name__
 
@@ -60,8 +93,9 @@ def builtin(name):
 
 @builtin('>')
 def operator_more(i):
-    arg1 = i.pop()
-    arg2 = i.pop()
+    pop = i.stack.pop
+    arg1 = pop()
+    arg2 = pop()
     if arg2 > arg1:
         i.push(1)
     else:
@@ -69,8 +103,9 @@ def operator_more(i):
 
 @builtin('<')
 def operator_less(i):
-    arg1 = i.pop()
-    arg2 = i.pop()
+    pop = i.stack.pop
+    arg1 = pop()
+    arg2 = pop()
     if arg2 < arg1:
         i.push(1)
     else:
@@ -78,8 +113,9 @@ def operator_less(i):
 
 @builtin('=')
 def operator_equals(i):
-    arg1 = i.pop()
-    arg2 = i.pop()
+    pop = i.stack.pop
+    arg1 = pop()
+    arg2 = pop()
     if arg2 == arg1:
         i.push(1)
     else:
@@ -87,31 +123,35 @@ def operator_equals(i):
 
 @builtin('*')
 def operator_asterisk(i):
-    arg1 = i.pop()
-    arg2 = i.pop()
+    pop = i.stack.pop
+    arg1 = pop()
+    arg2 = pop()
     i.push(arg2 + arg1)
 
 @builtin(':=')
 def operator_assign(i):
-    var = i.pop()
-    value = i.pop()
+    pop = i.stack.pop
+    var = pop()
+    value = pop()
     var.set(value)
 
 @builtin('+')
 def operator_plus(i):
-    arg1 = i.pop()
-    arg2 = i.pop()
+    pop = i.stack.pop
+    arg1 = pop()
+    arg2 = pop()
     i.push(arg2 + arg1)
 
 @builtin('-')
 def operator_minus(i):
-    arg1 = i.pop()
-    arg2 = i.pop()
+    pop = i.stack.pop
+    arg1 = pop()
+    arg2 = pop()
     i.push(arg2 - arg1)
 
 @builtin('add.period$')
 def add_period(i):
-    s = i.pop()
+    s = i.stack.pop()
     if s and not s.rstrip('}')[-1] in '.?!':
         s += '.'
     i.push(s)
@@ -134,8 +174,9 @@ def call_type(i):
 @builtin('change.case$')
 def change_case(i):
 
-    mode = i.pop()
-    string = i.pop()
+    pop = i.stack.pop
+    mode = pop()
+    string = pop()
 
     if not mode:
         raise BibTeXError('empty mode string passed to change.case$')
@@ -147,7 +188,7 @@ def change_case(i):
 
 @builtin('chr.to.int$')
 def chr_to_int(i):
-    s = i.pop()
+    s = i.stack.pop()
     try:
         value = ord(s)
     except TypeError:
@@ -160,14 +201,12 @@ def cite(i):
 
 @builtin('duplicate$')
 def duplicate(i):
-    tmp = i.pop()
-    i.push(tmp)
-    i.push(tmp)
+    i.push(i.stack[-1])
 
 @builtin('empty$')
 def empty(i):
     #FIXME error checking
-    s = i.pop()
+    s = i.stack.pop()
     if s and not s.isspace():
         i.push(0)
     else:
@@ -187,17 +226,19 @@ def _format_name(names, n, format):
 
 @builtin('format.name$')
 def format_name(i):
-    format = i.pop()
-    n = i.pop()
-    names = i.pop()
+    pop = i.stack.pop
+    format = pop()
+    n = pop()
+    names = pop()
     i.push(_format_name(names, n, format))
 
 
 @builtin('if$')
 def if_(i):
-    f1 = i.pop()
-    f2 = i.pop()
-    p = i.pop()
+    pop = i.stack.pop
+    f1 = pop()
+    f2 = pop()
+    p = pop()
     if p > 0:
         f2.execute(i)
     else:
@@ -205,7 +246,7 @@ def if_(i):
 
 @builtin('int.to.chr$')
 def int_to_chr(i):
-    n = i.pop()
+    n = i.stack.pop()
     try:
         char = chr(n)
     except ValueError:
@@ -214,11 +255,11 @@ def int_to_chr(i):
 
 @builtin('int.to.str$')
 def int_to_str(i):
-    i.push(str(i.pop()))
+    i.push(str(i.stack.pop()))
 
 @builtin('missing$')
 def missing(i):
-    f = i.pop()
+    f = i.stack.pop()
     if i.is_missing_field(f):
         i.push(1)
     else:
@@ -230,12 +271,12 @@ def newline(i):
 
 @builtin('num.names$')
 def num_names(i):
-    names = i.pop()
+    names = i.stack.pop()
     i.push(len(utils.split_name_list(names)))
 
 @builtin('pop$')
 def pop(i):
-    i.pop()
+    i.stack.pop()
 
 @builtin('preamble$')
 def preamble(i):
@@ -243,7 +284,7 @@ def preamble(i):
 
 @builtin('purify$')
 def purify(i):
-    s = i.pop()
+    s = i.stack.pop()
     i.push(utils.bibtex_purify(s))
 
 @builtin('quote$')
@@ -256,9 +297,10 @@ def skip(i):
 
 @builtin('substring$')
 def substring(i):
-    length = i.pop()
-    start = i.pop()
-    string = i.pop()
+    pop = i.stack.pop
+    length = pop()
+    start = pop()
+    string = pop()
     i.push(utils.bibtex_substring(string, start, length))
 
 @builtin('stack$')
@@ -268,20 +310,22 @@ def stack(i):
 
 @builtin('swap$')
 def swap(i):
-    tmp1 = i.pop()
-    tmp2 = i.pop()
+    pop = i.stack.pop
+    tmp1 = pop()
+    tmp2 = pop()
     i.push(tmp1)
     i.push(tmp2)
 
 @builtin('text.length$')
 def text_length(i):
-    s = i.pop()
+    s = i.stack.pop()
     i.push(utils.bibtex_len(s))
 
 @builtin('text.prefix$')
 def text_prefix(i):
-    l = i.pop()
-    s = i.pop()
+    pop = i.stack.pop
+    l = pop()
+    s = pop()
     i.push(utils.bibtex_prefix(s, l))
 
 @builtin('top$')
@@ -294,26 +338,27 @@ def type_(i):
 
 @builtin('warning$')
 def warning(i):
-    msg = i.pop()
+    msg = i.stack.pop()
     print_warning(msg)
 
 @builtin('while$')
 def while_(i):
-    f = i.pop()
-    p = i.pop()
+    pop = i.stack.pop
+    f = pop()
+    p = pop()
     while True:
         p.execute(i)
-        if i.pop() <= 0:
+        if pop() <= 0:
             break
         f.execute(i)
 
 @builtin('width$')
 def width(i):
     #FIXME need to investigate bibtex' source
-    s = i.pop()
+    s = i.stack.pop()
     i.push(utils.bibtex_len(s))
 
 @builtin('write$')
 def write(i):
-    s = i.pop()
+    s = i.stack.pop()
     i.output(s)
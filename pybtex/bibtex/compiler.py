@@ -0,0 +1,402 @@
+# Copyright (c) 2012  Andrey Golovizin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Compile BibTeX functions to Python code.
+
+Instead of walking the function body on each call and looking up every
+identifier in interpreter.vars, each function is translated to Python
+source code once, when it is defined:
+
+- identifiers are resolved at compile time (identifiers that are not
+  defined yet are looked up at run time, as by the interpreter);
+- simple built-in functions are inlined;
+- {...} {...} if$ and {...} {...} while$ become Python if and while
+  statements (quoted function names like 'skip$ may be used instead of
+  {...});
+- 'variable := becomes a direct call to variable.set().
+
+The compiled code behaves exactly like the interpreter.
+
+>>> from pybtex.bibtex.interpreter import Interpreter, Integer, String, Identifier
+>>> interpreter = Interpreter(None, None)
+>>> interpreter.command_integers([Identifier('x')])
+>>> interpreter.command_function([Identifier('test')], [
+...     Integer(2), Integer(3), Identifier('>'),
+...     FunctionLiteral([String('more')]),
+...     FunctionLiteral([String('less')]),
+...     Identifier('if$'),
+...     Integer(10), QuotedVar('x'), Identifier(':='),
+... ])
+>>> print interpreter.compiler.get_source(interpreter.vars['test'].body)
+def function(i):
+    try:
+        push(2)
+        push(3)
+        a = pop()
+        push(1 if pop() > a else 0)
+        if pop() > 0:
+            push(c0)
+        else:
+            push(c1)
+        push(10)
+        c2.set(pop())
+    except IndexError, error:
+        if stack or not is_stack_underflow(error, exc_info()[2]):
+            raise
+        raise BibTeXError('pop from empty stack')
+>>> interpreter.vars['test'].execute(interpreter)
+>>> interpreter.stack
+['less']
+>>> interpreter.vars['x']
+Integer(10)
+
+"""
+
+import imp
+import marshal
+import sys
+
+from pybtex.bibtex.exceptions import BibTeXError
+from pybtex.bibtex.builtins import builtins, Builtin, is_stack_underflow
+from pybtex.bibtex.interpreter import (
+    Function, FunctionLiteral, Identifier, QuotedVar,
+    Variable, EntryVariable, Integer, String, Field,
+)
+
+
+# Python code for simple built-in functions.
+# The code must be equivalent to the functions in pybtex.bibtex.builtins.
+inline_builtins = {
+    '>': ['a = pop()', 'push(1 if pop() > a else 0)'],
+    '<': ['a = pop()', 'push(1 if pop() < a else 0)'],
+    '=': ['a = pop()', 'push(1 if pop() == a else 0)'],
+    '*': ['a = pop()', 'push(pop() + a)'],
+    '+': ['a = pop()', 'push(pop() + a)'],
+    '-': ['a = pop()', 'push(pop() - a)'],
+    ':=': ['a = pop()', 'a.set(pop())'],
+    'cite$': ['push(i.current_entry_key)'],
+    'duplicate$': ['push(stack[-1])'],
+    'empty$': ['a = pop()', 'push(0 if a and not a.isspace() else 1)'],
+    'missing$': ['push(1 if is_missing_field(pop()) else 0)'],
+    'newline$': ['newline()'],
+    'pop$': ['pop()'],
+    'quote$': ['push(\'"\')'],
+    'skip$': [],
+    'swap$': ['a = pop()', 'b = pop()', 'push(a)', 'push(b)'],
+    'type$': ['push(i.current_entry.type)'],
+    'write$': ['output(pop())'],
+}
+
+
+function_template = """
+def make_function(i, constants):
+    stack = i.stack
+    push = stack.append
+    pop = stack.pop
+    output = i.output
+    newline = i.newline
+    is_missing_field = i.is_missing_field
+{constants}
+{function}
+    return function
+"""
+
+function_body_template = """def function(i):
+    try:
+{body}
+    except IndexError, error:
+        if stack or not is_stack_underflow(error, exc_info()[2]):
+            raise
+        raise BibTeXError('pop from empty stack')"""
+
+
+def indent(lines, level):
+    return '\n'.join('    ' * level + line for line in lines)
+
+
+def get_execute_function(cls):
+    return cls.execute.im_func
+
+
+# execute() methods that just push value()
+value_execute_functions = tuple(
+    get_execute_function(cls) for cls in (Variable, EntryVariable, Field)
+)
+
+
+class CompiledFunction(Function):
+    """A BibTeX function with compiled Python code.
+
+    The compiled code is stored in the execute attribute, so that it is
+    called directly by the interpreter and by other compiled functions.
+    """
+
+    def __init__(self, body, code):
+        super(CompiledFunction, self).__init__(body)
+        self.execute = code
+
+
+class FunctionCompiler(object):
+    """Translate the body of a single function to Python source code."""
+
+    max_indent = 40
+    max_loop_depth = 10
+
+    def __init__(self, compiler, body):
+        self.compiler = compiler
+        self.vars = compiler.interpreter.vars
+        self.body = body
+        self.lines = []
+        self.constants = []
+        self.constant_names = {}
+        self.loop_depth = 0
+
+    def get_source(self):
+        self.compile_body(self.body, 2)
+        return function_body_template.format(body='\n'.join(self.lines or ['        pass']))
+
+    def add_constant(self, value):
+        try:
+            return self.constant_names[id(value)]
+        except KeyError:
+            name = self.constant_names[id(value)] = 'c{0}'.format(len(self.constants))
+            self.constants.append(value)
+            return name
+
+    def emit(self, level, *lines):
+        self.lines.extend('    ' * level + line for line in lines)
+
+    def is_builtin(self, element, name):
+        return (
+            type(element) is Identifier
+            and element.value() == name
+            and self.vars.get(name) is builtins[name]
+        )
+
+    def compile_body(self, body, level):
+        pos = 0
+        while pos < len(body):
+            element = body[pos]
+            next_elements = body[pos + 1:pos + 3]
+            if self.compile_control_structure(element, next_elements, level):
+                pos += 3
+            elif self.compile_assignment(element, next_elements, level):
+                pos += 2
+            else:
+                self.compile_element(element, level)
+                pos += 1
+
+    def is_branch(self, element):
+        return (
+            type(element) is FunctionLiteral
+            or type(element) is QuotedVar and element.value() in self.vars
+        )
+
+    def compile_control_structure(self, element, next_elements, level):
+        if not (
+            len(next_elements) == 2
+            and self.is_branch(element)
+            and self.is_branch(next_elements[0])
+            and level < self.max_indent
+        ):
+            return False
+        function1, function2 = element, next_elements[0]
+        if self.is_builtin(next_elements[1], 'if$'):
+            self.emit(level, 'if pop() > 0:')
+            self.compile_branch(function1, level + 1)
+            self.emit(level, 'else:')
+            self.compile_branch(function2, level + 1)
+            return True
+        elif self.is_builtin(next_elements[1], 'while$') and self.loop_depth < self.max_loop_depth:
+            self.loop_depth += 1
+            self.emit(level, 'while True:')
+            self.compile_branch(function1, level + 1)
+            self.emit(level + 1, 'if pop() <= 0:', '    break')
+            self.compile_branch(function2, level + 1)
+            self.loop_depth -= 1
+            return True
+        return False
+
+    def compile_branch(self, function, level):
+        """Compile a function literal or a quoted function name inline."""
+        num_lines = len(self.lines)
+        if type(function) is FunctionLiteral:
+            self.compile_body(function.body, level)
+        else:
+            self.compile_call(function.value(), level)
+        if len(self.lines) == num_lines:
+            self.emit(level, 'pass')
+
+    def compile_assignment(self, element, next_elements, level):
+        if not (
+            type(element) is QuotedVar
+            and next_elements
+            and self.is_builtin(next_elements[0], ':=')
+            and element.value() in self.vars
+        ):
+            return False
+        variable = self.vars[element.value()]
+        self.emit(level, '{0}.set(pop())'.format(self.add_constant(variable)))
+        return True
+
+    def compile_element(self, element, level):
+        element_type = type(element)
+        if element_type is Integer:
+            self.emit(level, 'push({0!r})'.format(element.value()))
+        elif element_type is String:
+            self.emit(level, 'push({0})'.format(self.add_constant(element.value())))
+        elif element_type is FunctionLiteral:
+            function = self.compiler.compile_function(element.body)
+            self.emit(level, 'push({0})'.format(self.add_constant(function)))
+        elif element_type is QuotedVar and element.value() in self.vars:
+            variable = self.vars[element.value()]
+            self.emit(level, 'push({0})'.format(self.add_constant(variable)))
+        elif element_type is Identifier and element.value() in self.vars:
+            self.compile_call(element.value(), level)
+        else:
+            # undefined identifiers and anything else, executed as usual
+            self.emit(level, '{0}.execute(i)'.format(self.add_constant(element)))
+
+    def compile_call(self, name, level):
+        value = self.vars[name]
+        if value is builtins.get(name) and name in inline_builtins:
+            self.emit(level, *inline_builtins[name])
+        elif isinstance(value, Builtin):
+            self.emit(level, '{0}(i)'.format(self.add_constant(value.f)))
+        elif type(value) in (Integer, String):
+            self.emit(level, 'push({0}._value)'.format(self.add_constant(value)))
+        elif get_execute_function(type(value)) in value_execute_functions:
+            self.emit(level, 'push({0}())'.format(self.add_constant(value.value)))
+        else:
+            self.emit(level, '{0}.execute(i)'.format(self.add_constant(value)))
+
+    def compile(self):
+        function_source = self.get_source()
+        source = function_template.format(
+            constants=indent([
+                '{0} = constants[{1}]'.format(self.add_constant(value), index)
+                for index, value in enumerate(self.constants)
+            ], 1),
+            function=indent(function_source.splitlines(), 1),
+        )
+        namespace = {
+            'BibTeXError': BibTeXError,
+            'is_stack_underflow': is_stack_underflow,
+            'exc_info': sys.exc_info,
+        }
+        exec self.compiler.code_cache.compile(source) in namespace
+        return namespace['make_function'](self.compiler.interpreter, self.constants)
+
+
+class CodeCache(object):
+    """Python code objects for the generated source code.
+
+    Compiling the generated code takes more time than generating it, so
+    code objects are reused for identical sources (most functions of
+    plain.bst and unsrt.bst are identical, for example). If file_cache is
+    given, the code objects are stored on disk with marshal, see save().
+
+    >>> code_cache = CodeCache()
+    >>> code = code_cache.compile('x = 1')
+    >>> code_cache.compile('x = 1') is code
+    True
+
+    """
+
+    def __init__(self, file_cache=None, max_size=10000):
+        self.file_cache = file_cache
+        self.max_size = max_size
+        # marshal format depends on Python version
+        self.key = ('pybtex.bibtex.compiler', imp.get_magic())
+        self.code = None
+        self.used_sources = set()
+        self.modified = False
+
+    def load(self):
+        self.code = {}
+        if self.file_cache:
+            data = self.file_cache.load(self.key)
+            if data is not None:
+                try:
+                    self.code = marshal.loads(data)
+                except (ValueError, EOFError, TypeError):
+                    pass
+
+    def compile(self, source):
+        if self.code is None:
+            self.load()
+        self.used_sources.add(source)
+        try:
+            return self.code[source]
+        except KeyError:
+            code = self.code[source] = compile(source, '<bst function>', 'exec')
+            self.modified = True
+            return code
+
+    def save(self):
+        """Store the code objects in the file cache if there are new ones.
+
+        If there are too many code objects, only those used since the cache
+        was created are kept.
+        """
+        if not (self.file_cache and self.modified):
+            return
+        if len(self.code) > self.max_size:
+            self.code = dict(
+                (source, code) for source, code in self.code.iteritems()
+                if source in self.used_sources
+            )
+        self.file_cache.save(self.key, marshal.dumps(self.code))
+        self.modified = False
+
+
+# used when no code cache is given, shared by all interpreters
+default_code_cache = CodeCache()
+
+
+class Compiler(object):
+    """Compile BibTeX functions for a particular interpreter.
+
+    The compiled code refers to the interpreter's variables, so the
+    functions must be recompiled if any variable is redefined (see
+    recompile()).
+    """
+
+    def __init__(self, interpreter, code_cache=None):
+        self.interpreter = interpreter
+        self.code_cache = code_cache or default_code_cache
+        self.functions = []
+
+    def compile_function(self, body):
+        return CompiledFunction(body, FunctionCompiler(self, body).compile())
+
+    def add_function(self, body):
+        """Compile a function defined with the FUNCTION command."""
+        function = self.compile_function(body)
+        self.functions.append(function)
+        return function
+
+    def recompile(self):
+        for function in self.functions:
+            function.execute = FunctionCompiler(self, function.body).compile()
+
+    def get_source(self, body):
+        return FunctionCompiler(self, body).get_source()
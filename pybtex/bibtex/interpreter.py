@@ -19,12 +19,33 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+import sys
+from itertools import izip
+
+from pybtex import errors
+from pybtex.exceptions import FormattedError
 from pybtex.bibtex.exceptions import BibTeXError
 from pybtex.bibtex.builtins import builtins, print_warning
 from pybtex.bibtex.utils import wrap
 #from pybtex.database.input import bibtex
 
 
+# the interpreter used by a worker process in Interpreter.iterate_parallel(),
+# set by _init_iterate_worker() when the worker is started
+_worker_interpreter = None
+
+
+def _init_iterate_worker(interpreter):
+    global _worker_interpreter
+    _worker_interpreter = interpreter
+
+
+def _run_iterate_job(args):
+    if _worker_interpreter is None:
+        return None
+    return _worker_interpreter.run_iterate_job(*args)
+
+
 class Variable(object):
 
     def _undefined(self):
@@ -40,11 +61,14 @@ class Variable(object):
     def set(self, value):
         if value is None:
             value = self.default
-        self.validate(value)
+        elif not isinstance(value, self.value_type):
+            self.invalid_value(value)
         self._value = value
     def validate(self, value):
         if not (isinstance(value, self.value_type) or value is None):
-            raise ValueError('Invalid value for BibTeX %s: %s' % (self.__class__.__name__, value))
+            self.invalid_value(value)
+    def invalid_value(self, value):
+        raise ValueError('Invalid value for BibTeX %s: %s' % (self.__class__.__name__, value))
     def execute(self, interpreter):
         interpreter.push(self.value())
     def value(self):
@@ -64,8 +88,11 @@ class EntryVariable(Variable):
         self.name = name
     def set(self, value):
         if value is not None:
-            self.validate(value)
+            if not isinstance(value, self.value_type):
+                self.invalid_value(value)
             self.interpreter.current_entry.vars[self.name] = value
+    def execute(self, interpreter):
+        interpreter.push(self.value())
     def value(self):
         try:
             return self.interpreter.current_entry.vars[self.name]
@@ -77,8 +104,12 @@ class Integer(Variable):
     value_type = int
     default = 0
 
+    def execute(self, interpreter):
+        # literals and global variables push their values unboxed
+        interpreter.push(self._value)
+
 
-class EntryInteger(Integer, EntryVariable):
+class EntryInteger(EntryVariable, Integer):
     pass
 
 
@@ -86,8 +117,11 @@ class String(Variable):
     value_type = basestring
     default = ''
 
+    def execute(self, interpreter):
+        interpreter.push(self._value)
+
 
-class EntryString(String, EntryVariable):
+class EntryString(EntryVariable, String):
     pass
 
 
@@ -172,11 +206,33 @@ class FunctionLiteral(Function):
 
 
 class Interpreter(object):
-    def __init__(self, bib_format, bib_encoding):
+    # do not start worker processes for fewer citations
+    min_parallel_citations = 1000
+
+    def __init__(self, bib_format, bib_encoding, parser_options=None, compile_functions=True, code_cache=None, processes=None):
+        """
+        If compile_functions is True, BibTeX functions are compiled to
+        Python code (see pybtex.bibtex.compiler). Otherwise they are
+        interpreted. If code_cache is given, it is used to compile the
+        generated code and saved at the end of run().
+
+        If processes is greater than 1, ITERATE and REVERSE run functions
+        that only change the current entry in a pool of that many worker
+        processes (see iterate_parallel()).
+        """
         self.bib_format = bib_format
         self.bib_encoding = bib_encoding
+        self.parser_options = parser_options or {}
+        self.processes = processes
         self.stack = []
+        # push is called for nearly every value, so it is bound once
+        self.push = self.stack.append
         self.vars = dict(builtins)
+        if compile_functions:
+            from pybtex.bibtex.compiler import Compiler
+            self.compiler = Compiler(self, code_cache)
+        else:
+            self.compiler = None
         #FIXME is 10000 OK?
         self.add_variable('global.max$', Integer(10000))
         self.add_variable('entry.max$', Integer(10000))
@@ -184,11 +240,6 @@ class Interpreter(object):
         self.macros = {}
         self.output_buffer = []
 
-    def push(self, value):
-#        print 'push <%s>' % value
-        self.stack.append(value)
-#        print 'stack:', self.stack
-
     def pop(self):
         try:
             value = self.stack.pop()
@@ -205,6 +256,13 @@ class Interpreter(object):
             raise BibTeXError('variable "{0}" already declared as {1}'.format(name, type(value).__name__))
         self.vars[name] = value
 
+    def set_variable(self, name, value):
+        """Define or redefine a variable."""
+        redefined = name in self.vars
+        self.vars[name] = value
+        if redefined and self.compiler:
+            self.compiler.recompile()
+
     def output(self, string):
         self.output_buffer.append(string)
 
@@ -231,6 +289,8 @@ class Interpreter(object):
                 print 'Unknown command', name
 
         self.output_file.close()
+        if self.compiler:
+            self.compiler.code_cache.save()
 
     def command_entry(self, fields, ints, strings):
         for id in fields:
@@ -250,12 +310,16 @@ class Interpreter(object):
 
     def command_function(self, name_, body):
         name = name_[0].value()
-        self.add_variable(name, Function(body))
+        if self.compiler:
+            function = self.compiler.add_function(body)
+        else:
+            function = Function(body)
+        self.add_variable(name, function)
 
     def command_integers(self, identifiers):
 #        print 'INTEGERS'
         for identifier in identifiers:
-            self.vars[identifier.value()] = Integer()
+            self.set_variable(identifier.value(), Integer())
 
     def command_iterate(self, function_group):
         function = function_group[0].value()
@@ -263,12 +327,116 @@ class Interpreter(object):
 
     def _iterate(self, function, citations):
         f = self.vars[function]
+        if self.processes > 1:
+            citations = list(citations)
+            if self.iterate_parallel(function, citations):
+                return
         for key in citations:
             self.current_entry_key = key
             self.current_entry = self.bib_data.entries[key]
             f.execute(self)
         self.currentEntry = None
 
+    def iterate_parallel(self, function, citations):
+        """Run the function for each citation in a pool of worker processes.
+
+        This is only done if the function only changes the current entry
+        (see pybtex.bibtex.analysis). The citations are split into one
+        chunk per process. The workers return the entry variables, the
+        last values assigned to global variables and the reported errors,
+        and the results are merged in the original order.
+
+        The workers must be forked from this process, as the interpreter
+        can not be pickled. On platforms where multiprocessing does not
+        fork, the function is always run sequentially.
+
+        Return False if the function can not be run in parallel or any of
+        the workers failed. The interpreter state is not changed in that
+        case, and the function should be run sequentially.
+        """
+        from multiprocessing import Pool
+        from pybtex.bibtex.analysis import Analyzer
+
+        if len(citations) < self.min_parallel_citations:
+            return False
+        if sys.platform == 'win32':
+            return False
+        analyzer = Analyzer(self.vars)
+        f = self.vars[function]
+        if not analyzer.is_entry_local(f):
+            return False
+        global_names = sorted(analyzer.analyze(f).may_write)
+        chunk_size = -(-len(citations) // self.processes)
+        chunks = [
+            citations[start:start + chunk_size]
+            for start in xrange(0, len(citations), chunk_size)
+        ]
+
+        pool = Pool(self.processes, _init_iterate_worker, (self,))
+        try:
+            results = pool.map(_run_iterate_job, [
+                (function, keys, global_names) for keys in chunks
+            ])
+        finally:
+            pool.terminate()
+        if None in results:
+            return False
+
+        for keys, (entry_vars, global_values, job_errors) in izip(chunks, results):
+            for error in job_errors:
+                errors.report_error(error)
+            for key, vars in izip(keys, entry_vars):
+                self.bib_data.entries[key].vars.update(vars)
+            # later chunks override earlier ones, as in a sequential run
+            for name, value in global_values.iteritems():
+                self.vars[name].set(value)
+        self.current_entry_key = citations[-1]
+        self.current_entry = self.bib_data.entries[citations[-1]]
+        return True
+
+    def run_iterate_job(self, function, keys, global_names):
+        """Run the function for the given citations in a worker process.
+
+        Only the global variables actually assigned by the function are
+        returned, so that the values from other chunks are not overwritten.
+
+        Return None if anything went wrong, or if the function left
+        something on the stack (the results would depend on the order of
+        citations then).
+        """
+        f = self.vars[function]
+        stack = list(self.stack)
+        entry_vars = []
+        assigned = set()
+
+        def track_assignments(name, set_value):
+            def set(value):
+                set_value(value)
+                assigned.add(name)
+            return set
+
+        # both interpreted and compiled code assign variables with set()
+        global_vars = [self.vars[name] for name in global_names]
+        for name, var in izip(global_names, global_vars):
+            var.set = track_assignments(name, var.set)
+        try:
+            with errors.collect() as report:
+                for key in keys:
+                    self.current_entry_key = key
+                    self.current_entry = self.bib_data.entries[key]
+                    f.execute(self)
+                    if self.stack != stack:
+                        return None
+                    entry_vars.append(self.current_entry.vars)
+        except Exception:
+            return None
+        finally:
+            for var in global_vars:
+                del var.set
+        global_values = dict((name, self.vars[name].value()) for name in assigned)
+        job_errors = [FormattedError.from_error(error) for error in report]
+        return entry_vars, global_values, job_errors
+
     def command_macro(self, name_, value_):
         name = name_[0].value()
         value = value_[0].value()
@@ -281,6 +449,7 @@ class Interpreter(object):
             macros=self.macros,
             person_fields=[],
             wanted_entries=self.citations,
+            **self.parser_options
         )
         self.bib_data = p.parse_files(self.bib_files)
         self.citations = self.bib_data.add_extra_citations(self.citations, self.min_crossrefs)
@@ -310,7 +479,7 @@ class Interpreter(object):
     def command_strings(self, identifiers):
         #print 'STRINGS'
         for identifier in identifiers:
-            self.vars[identifier.value()] = String()
+            self.set_variable(identifier.value(), String())
 
     @staticmethod
     def is_missing_field(field):
@@ -32,6 +32,7 @@ abc
 import re
 
 from pybtex.database import Person
+from pybtex.utils import memoize
 from pybtex.bibtex.utils import bibtex_len, bibtex_first_letter
 from pybtex.scanner import (
     Scanner, Pattern, Literal,
@@ -260,8 +261,13 @@ def join(words, tie='~', space=' '):
                 space.join(words[1:-1]) +
                 tie + words[-1])
 
+@memoize
+def get_name_format(format):
+    return NameFormat(format)
+
+
 def format(name, format):
-    return NameFormat(format).format(name)
+    return get_name_format(format).format(name)
 
 
 class UnbalancedBraceError(PybtexSyntaxError):
@@ -22,10 +22,17 @@
 import re
 
 from pybtex.bibtex.exceptions import BibTeXError
+from pybtex.utils import memoize
 
 whitespace_re = re.compile('(\s)')
 purify_special_char_re = re.compile(r'^\\[A-Za-z]+')
 
+# the functions below are memoized and have fast paths for strings without
+# braces (most strings are like that); strings with braces are scanned with
+# BibTeXString
+purify_delete_re = re.compile(ur'[^\w\s~-]|_', re.UNICODE)
+purify_space_re = re.compile(ur'[\s~-]', re.UNICODE)
+
 def wrap(string, width=79):
     def wrap_chunks(chunks, width, initial_indent='', subsequent_indent='  '):
         space_len = 1
@@ -108,6 +115,7 @@ class BibTeXString(object):
         return ''.join(unicode(child) for child in self.contents)
 
 
+@memoize
 def change_case(string, mode):
     r"""
     >>> print change_case('aBcD', 'l')
@@ -130,8 +138,52 @@ def change_case(string, mode):
     and {\Now: {booo}!!!}
     >>> print change_case(r'{\TeX\ and databases\Dash\TeX DBI}', 't')
     {\TeX\ and databases\Dash\TeX DBI}
+    >>> print change_case(r'BOOO: Now: :  And: Then:', 't')
+    Booo: Now: :  and: Then:
+    >>> print change_case(r'}BOOO} :}', 't')
+    }booo} :}
+    >>> print change_case(r'', 't')
+    <BLANKLINE>
+
+    The results are memoized, even for strings without braces:
+
+    >>> change_case.cache_clear()
+    >>> print change_case('ABcD', 't'), change_case('ABcD', 't')
+    Abcd Abcd
+    >>> change_case.cache_info().hits
+    1
     """
 
+    if '{' not in string:
+        if mode == 'l':
+            return string.lower()
+        elif mode == 'u':
+            return string.upper()
+        else:
+            return title_case(string)
+    return _change_case(string, mode)
+
+
+def title_case(string):
+    """Convert a string without braces to title case, as change_case does.
+
+    The first character and the characters after a colon and a single
+    whitespace character are left as is, everything else is lowercased.
+    """
+
+    result = string[:1] + string[1:].lower()
+    colon_pos = string.find(':')
+    if colon_pos == -1:
+        return result
+    chars = list(result)
+    while colon_pos != -1:
+        if string[colon_pos + 1:colon_pos + 2].isspace():
+            chars[colon_pos + 2:colon_pos + 3] = string[colon_pos + 2:colon_pos + 3]
+        colon_pos = string.find(':', colon_pos + 1)
+    return string[:0].join(chars)
+
+
+def _change_case(string, mode):
     def title(char, state):
         if state == 'start':
             return char
@@ -210,6 +262,7 @@ def bibtex_substring(string, start, length):
     return string[start0:end0]
 
 
+@memoize
 def bibtex_len(string):
     r"""Return the number of characters in the string.
 
@@ -242,6 +295,12 @@ def bibtex_len(string):
     >>> print bibtex_len(r'level 0 {1 {\2}}')
     12
     """
+    if '{' not in string:
+        return len(string) - string.count('}')
+    return _bibtex_len(string)
+
+
+def _bibtex_len(string):
     length = 0
     for char, brace_level in scan_bibtex_string(string):
         if char not in '{}':
@@ -249,6 +308,7 @@ def bibtex_len(string):
     return length
 
 
+@memoize
 def bibtex_prefix(string, num_chars):
     """Return the firxt num_char characters of the string.
 
@@ -270,8 +330,19 @@ def bibtex_prefix(string, num_chars):
     ab{\cd}
     >>> print bibtex_prefix(r'ab{\cd', 3)
     ab{\cd}
+    >>> print bibtex_prefix('abc', 0)
+    a
+    >>> print bibtex_prefix('', 3)
+    <BLANKLINE>
 
     """
+    if '{' not in string and '}' not in string:
+        # at least one character is returned, as in the general case
+        return string[:max(num_chars, 1)]
+    return _bibtex_prefix(string, num_chars)
+
+
+def _bibtex_prefix(string, num_chars):
     def prefix():
         length = 0
         for char, brace_level in scan_bibtex_string(string):
@@ -285,6 +356,7 @@ def bibtex_prefix(string, num_chars):
     return ''.join(prefix())
 
 
+@memoize
 def bibtex_purify(string):
     r"""Strip special characters from the string.
 
@@ -316,8 +388,26 @@ def bibtex_purify(string):
     sortabc1973b1973
     >>> print bibtex_purify(r'{\noopsort{1973a}}{\switchargs{--90}{1968}}')
     1973a901968
+    >>> bibtex_purify(u'Caf\xe9 _~\t\u2013-} 1\xb2')
+    u'Caf\xe9     1\xb2'
+
+    The results are memoized, even for strings without braces:
+
+    >>> bibtex_purify.cache_clear()
+    >>> print bibtex_purify(u'Abc-Def'), bibtex_purify(u'Abc-Def')
+    Abc Def Abc Def
+    >>> bibtex_purify.cache_info().hits
+    1
     """
 
+    # the regexps match unicode.isalnum() and unicode.isspace() exactly,
+    # while str methods depend on the locale
+    if type(string) is unicode and '{' not in string:
+        return purify_space_re.sub(u' ', purify_delete_re.sub(u'', string))
+    return _bibtex_purify(string)
+
+
+def _bibtex_purify(string):
     # FIXME BibTeX treats some accented and foreign characterss specially
     def purify_iter(string):
         for token, brace_level in scan_bibtex_string(string):
@@ -365,6 +455,10 @@ def split_name_list(string):
     return split_tex_string(string, ' and ')
 
 
+default_sep = r'[\s~]+'
+separator_cache = {}
+
+
 def split_tex_string(string, sep=None, strip=True, filter_empty=False):
     """Split a string using the given separator (regexp).
 
@@ -389,29 +483,41 @@ def split_tex_string(string, sep=None, strip=True, filter_empty=False):
     ['a']
     >>> split_tex_string('on a')
     ['on', 'a']
+    >>> split_tex_string('{Barnes and Noble} and {Smith and} Wesson', ' and ')
+    ['{Barnes and Noble}', '{Smith and} Wesson']
     """
 
     if sep is None:
-        sep = '[\s~]+'
+        sep = default_sep
         filter_empty = True
-    sep_re = re.compile(sep)
+    try:
+        sep_search = separator_cache[sep]
+    except KeyError:
+        sep_search = separator_cache[sep] = re.compile(sep).search
     brace_level = 0
+    brace_level_pos = 0
     name_start = 0
     result = []
     string_len = len(string)
-    pos = 0
-    for pos, char in enumerate(string):
-        if char == '{':
-            brace_level += 1
-        elif char == '}':
-            brace_level -= 1
-        elif brace_level == 0 and pos > 0:
-            match = sep_re.match(string[pos:])
-            if match:
-                sep_len = len(match.group())
-                if pos + sep_len < string_len:
-                    result.append(string[name_start:pos])
-                    name_start = pos + sep_len
+    pos = 1
+    # separators are searched for in place, and brace levels are updated by
+    # counting braces between the matches
+    while True:
+        match = sep_search(string, pos)
+        if not match or match.start() >= string_len:
+            break
+        match_start = match.start()
+        brace_level += (
+            string.count('{', brace_level_pos, match_start)
+            - string.count('}', brace_level_pos, match_start)
+        )
+        brace_level_pos = match_start
+        if brace_level == 0 and string[match_start] not in '{}':
+            match_end = match.end()
+            if match_end < string_len:
+                result.append(string[name_start:match_start])
+                name_start = match_end
+        pos = match_start + 1
     if name_start < string_len:
         result.append(string[name_start:])
     if strip:
@@ -0,0 +1,123 @@
+# Copyright (c) 2012  Andrey Golovizin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Persistent on-disk cache for parsed data.
+
+>>> from tempfile import mkdtemp
+>>> from shutil import rmtree
+>>> cache_dir = mkdtemp()
+>>> cache = FileCache(cache_dir, max_size=1000)
+>>> print cache.load(('some', 'key'))
+None
+>>> cache.save(('some', 'key'), [u'some', u'data'])
+>>> cache.load(('some', 'key'))
+[u'some', u'data']
+>>> import os
+>>> cache.save(('large', 'data'), os.urandom(2000))
+>>> print cache.load(('some', 'key'))
+None
+>>> print cache.load(('large', 'data'))
+None
+>>> rmtree(cache_dir)
+
+"""
+
+from __future__ import with_statement
+
+import os
+import zlib
+import cPickle as pickle
+from hashlib import sha1
+from tempfile import mkstemp
+
+from pybtex.__version__ import version
+
+
+def get_default_cache_dir():
+    try:
+        return os.environ['PYBTEX_CACHE_DIR']
+    except KeyError:
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_home, 'pybtex')
+
+
+def get_content_hash(data):
+    return sha1(data).hexdigest()
+
+
+class FileCache(object):
+    """A size-bounded directory of pickled and compressed objects.
+
+    When the total size of the cache exceeds max_size bytes, the least
+    recently used files are removed.
+    """
+
+    suffix = '.cache'
+
+    def __init__(self, directory=None, max_size=100 * 1024 * 1024):
+        self.directory = directory or get_default_cache_dir()
+        self.max_size = max_size
+
+    def get_filename(self, key):
+        key_hash = sha1(repr((version, key))).hexdigest()
+        return os.path.join(self.directory, key_hash + self.suffix)
+
+    def load(self, key):
+        """Return the object stored under the key, or None."""
+        filename = self.get_filename(key)
+        try:
+            with open(filename, 'rb') as cache_file:
+                data = cache_file.read()
+            os.utime(filename, None)
+            return pickle.loads(zlib.decompress(data))
+        except (EnvironmentError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None
+
+    def save(self, key, obj):
+        data = zlib.compress(pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            fd, temp_filename = mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as cache_file:
+                cache_file.write(data)
+            os.rename(temp_filename, self.get_filename(key))
+            self.evict()
+        except EnvironmentError:
+            pass
+
+    def evict(self):
+        """Remove the least recently used files until the cache is small enough."""
+        files = []
+        total_size = 0
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, filename)
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+            total_size += stat.st_size
+        files.sort()
+        for mtime, size, path in files:
+            if total_size <= self.max_size:
+                break
+            os.remove(path)
+            total_size -= size
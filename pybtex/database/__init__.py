@@ -25,9 +25,10 @@ from collections import Mapping
 
 from pybtex.exceptions import PybtexError
 from pybtex.utils import (
-    OrderedCaseInsensitiveDict, CaseInsensitiveDefaultDict, CaseInsensitiveSet
+    OrderedCaseInsensitiveDict, CaseInsensitiveDefaultDict, CaseInsensitiveSet,
+    SlotsPickleMixin, LRUCache,
 )
-from pybtex.bibtex.utils import split_tex_string
+from pybtex.bibtex.utils import split_tex_string, split_name_list
 from pybtex.errors import report_error
 
 
@@ -41,6 +42,10 @@ class BibliographyData(object):
         self.crossref_count = CaseInsensitiveDefaultDict(int)
         self.min_crossrefs = min_crossrefs
         self._preamble = []
+        self._crossref_chains = None
+        self._crossref_children = None
+        self.crossref_version = 0
+        self.listeners = []
         if wanted_entries is not None:
             self.wanted_entries = CaseInsensitiveSet(wanted_entries)
         else:
@@ -88,22 +93,181 @@ class BibliographyData(object):
             return
         entry.collection = self
         entry.key = key
-        entry.key = key
         self.entries[key] = entry
-        try:
-            crossref = entry.fields['crossref']
-        except KeyError:
-            pass
-        else:
-            self.crossref_count[crossref] += 1
-            if self.crossref_count[crossref] >= self.min_crossrefs:
-                if self.wanted_entries is not None:
-                    self.wanted_entries.add(crossref)
+        self.count_crossref(entry, 1)
+        self.invalidate_crossrefs()
+        if self.listeners:
+            self.notify('add', key)
 
     def add_entries(self, entries):
         for key, entry in entries:
             self.add_entry(key, entry)
 
+    def replace_entry(self, key, entry):
+        """Replace an existing entry with a new one, or add a new entry."""
+        try:
+            old_entry = self.entries[key]
+        except KeyError:
+            return self.add_entry(key, entry)
+        self.count_crossref(old_entry, -1)
+        entry.collection = self
+        entry.key = key
+        self.entries[key] = entry
+        self.count_crossref(entry, 1)
+        self.invalidate_crossrefs()
+        if self.listeners:
+            self.notify('replace', key)
+
+    def remove_entry(self, key):
+        entry = self.entries[key]
+        del self.entries[key]
+        self.count_crossref(entry, -1)
+        self.invalidate_crossrefs()
+        if self.listeners:
+            self.notify('remove', key)
+
+    def update(self, other):
+        """Make the entries the same as in other BibliographyData.
+
+        Only the entries that differ are added, replaced or removed, so that
+        listeners are notified of the actual changes only. The entries are
+        then put in the same order as in other BibliographyData.
+
+        >>> from pybtex.database import Entry
+        >>> data = BibliographyData([
+        ...     ('uno', Entry('article', {'title': 'One'})),
+        ...     ('dos', Entry('article', {'title': 'Two'})),
+        ... ])
+        >>> def print_change(action, key):
+        ...     print action, key
+        >>> data.listeners.append(print_change)
+        >>> data.update(BibliographyData([
+        ...     ('uno', Entry('article', {'title': 'One'})),
+        ...     ('dos', Entry('article', {'title': 'Two, revised'})),
+        ...     ('tres', Entry('article', {'title': 'Three'})),
+        ... ]))
+        replace dos
+        add tres
+        >>> data.update(BibliographyData([
+        ...     ('uno', Entry('article', {'title': 'One'})),
+        ...     ('cero', Entry('article', {'title': 'Zero'})),
+        ...     ('dos', Entry('article', {'title': 'Two, revised'})),
+        ...     ('tres', Entry('article', {'title': 'Three'})),
+        ... ]))
+        add cero
+        >>> data.entries.keys()
+        ['uno', 'cero', 'dos', 'tres']
+        >>> data.update(BibliographyData([('tres', Entry('article', {'title': 'Three'}))]))
+        remove uno
+        remove cero
+        remove dos
+
+        """
+        for key in list(self.entries):
+            if key not in other.entries:
+                self.remove_entry(key)
+        for key, entry in other.entries.iteritems():
+            if key not in self.entries:
+                self.add_entry(key, entry)
+            elif self.entries[key] != entry:
+                self.replace_entry(key, entry)
+        if self.entries.keys() != other.entries.keys():
+            entries = self.entries
+            self.entries = OrderedCaseInsensitiveDict(
+                (entries[key].key, entries[key]) for key in other.entries
+            )
+        self._preamble = list(other._preamble)
+
+    def notify(self, action, key):
+        """Call the listeners after an entry is added, replaced or removed.
+
+        Listeners are called with two arguments: the action ('add',
+        'replace' or 'remove') and the entry key.
+        """
+        for listener in self.listeners:
+            listener(action, key)
+
+    def count_crossref(self, entry, increment):
+        crossref = entry.fields.get('crossref')
+        if crossref is None:
+            return
+        self.crossref_count[crossref] += increment
+        if increment > 0 and self.crossref_count[crossref] >= self.min_crossrefs:
+            if self.wanted_entries is not None:
+                self.wanted_entries.add(crossref)
+
+    def invalidate_crossrefs(self):
+        """Forget the resolved cross-references and the inherited fields.
+
+        This is done automatically when entries are added or entry fields
+        are changed.
+        """
+        self._crossref_chains = None
+        self._crossref_children = None
+        self.crossref_version += 1
+
+    def get_crossref_children(self, key):
+        """Return the keys of the entries inheriting fields from the entry.
+
+        Both direct and indirect cross-references are followed. The entry
+        itself does not have to exist.
+
+        >>> from pybtex.database import Entry
+        >>> data = BibliographyData([
+        ...     ('article', Entry('article', {'crossref': 'Proceedings'})),
+        ...     ('proceedings', Entry('proceedings', {'crossref': 'series'})),
+        ... ])
+        >>> data.get_crossref_children('Series')
+        ['proceedings', 'article']
+
+        """
+        if self._crossref_children is None:
+            self._crossref_children = {}
+            for child_key, entry in self.entries.iteritems():
+                crossref = entry.fields.get('crossref')
+                if crossref is not None:
+                    self._crossref_children.setdefault(crossref.lower(), []).append(child_key)
+        result = []
+        seen = set([key.lower()])
+        queue = [key]
+        while queue:
+            for child_key in self._crossref_children.get(queue.pop().lower(), ()):
+                if child_key.lower() not in seen:
+                    seen.add(child_key.lower())
+                    result.append(child_key)
+                    queue.append(child_key)
+        return result
+
+    def get_crossref_chain(self, key):
+        """Return the list of entries from which the entry inherits fields.
+
+        Cross-references are resolved for all entries at once, and the
+        results are reused until invalidate_crossrefs() is called.
+
+        >>> from pybtex.database import Entry
+        >>> data = BibliographyData([
+        ...     ('article', Entry('article', {'crossref': 'Proceedings'})),
+        ...     ('proceedings', Entry('proceedings', {'crossref': 'series', 'year': '1997'})),
+        ...     ('series', Entry('book', {'publisher': 'Springer'})),
+        ... ])
+        >>> [entry.key for entry in data.get_crossref_chain('Article')]
+        ['proceedings', 'series']
+        >>> print data.entries['article'].fields['publisher']
+        Springer
+        >>> data.entries['series'].fields['publisher'] = 'Wiley'
+        >>> print data.entries['article'].fields['publisher']
+        Wiley
+
+        """
+        if self._crossref_chains is None:
+            reported_cycles = set()
+            self._crossref_chains = dict(
+                (key.lower(), entry.resolve_crossref_chain(reported_cycles))
+                for key, entry in self.entries.iteritems()
+                if 'crossref' in entry.fields
+            )
+        return self._crossref_chains.get(key.lower(), ())
+
     def get_crossreferenced_citations(self, citations, min_crossrefs):
         """
         Get cititations not cited explicitly but referenced by other citations.
@@ -145,9 +309,12 @@ class BibliographyData(object):
         for citation in citations:
             try:
                 entry = self.entries[citation]
-                crossref = entry.fields['crossref']
             except KeyError:
                 continue
+            # crossref is never inherited, so skip FieldDict.__missing__
+            crossref = entry.fields.get('crossref')
+            if crossref is None:
+                continue
             if crossref not in self.entries:
                 report_error(BibliographyDataError(
                     'bad cross-reference: entry "{key}" refers to '
@@ -205,26 +372,142 @@ class BibliographyData(object):
         return expanded_citations + crossrefs
 
 
-class FieldDict(dict):
+class EntryDict(SlotsPickleMixin, dict):
+    """A dict of entry data that calls invalidate() when it is changed."""
+
+    __slots__ = 'parent',
+
     def __init__(self, parent, *args, **kwargw):
         self.parent = parent
         dict.__init__(self, *args, **kwargw)
+
+    def __getstate__(self):
+        return {'parent': self.parent}
+
+    def __setstate__(self, state):
+        self.parent = state['parent']
+
+    def invalidate(self):
+        raise NotImplementedError
+
+    def __setitem__(self, key, value):
+        dict.__setitem__(self, key, value)
+        self.invalidate()
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.invalidate()
+
+    def clear(self):
+        dict.clear(self)
+        self.invalidate()
+
+    def pop(self, *args):
+        result = dict.pop(self, *args)
+        self.invalidate()
+        return result
+
+    def popitem(self):
+        result = dict.popitem(self)
+        self.invalidate()
+        return result
+
+    def setdefault(self, key, default=None):
+        result = dict.setdefault(self, key, default)
+        self.invalidate()
+        return result
+
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self.invalidate()
+
+
+class FieldDict(EntryDict):
+    """Entry fields.
+
+    Missing fields are taken from persons and cross-referenced entries.
+    These inherited values are cached until the fields or persons of any
+    entry in the collection are changed (see PersonDict), which changes the
+    collection's crossref_version. Person lists are not watched, so call
+    invalidate() after changing them in place (Entry.add_person() does
+    this).
+    """
+
+    __slots__ = '_inherited', '_inherited_version'
+
+    def __init__(self, parent, *args, **kwargw):
+        self._inherited = None
+        super(FieldDict, self).__init__(parent, *args, **kwargw)
+
+    def __setstate__(self, state):
+        super(FieldDict, self).__setstate__(state)
+        self._inherited = None
+
     def __missing__(self, key):
-        if key in self.parent.persons:
-            persons = self.parent.persons[key]
-            return ' and '.join(unicode(person) for person in persons)
-        elif 'crossref' in self:
-            return self.parent.get_crossref().fields[key]
-        else:
+        version = getattr(self.parent.collection, 'crossref_version', None)
+        inherited = self._inherited
+        if inherited is None or self._inherited_version != version:
+            inherited = self._inherited = {}
+            self._inherited_version = version
+        try:
+            value = inherited[key]
+        except KeyError:
+            value = inherited[key] = self.inherit(key)
+        if value is None:
             raise KeyError(key)
+        return value
+
+    def inherit(self, key):
+        """Return the value of a missing field, or None."""
+        entry = self.parent
+        if key in entry.persons:
+            return ' and '.join(unicode(person) for person in entry.persons[key])
+        for crossref_entry in entry.get_crossref_chain():
+            crossref_fields = crossref_entry.fields
+            if dict.__contains__(crossref_fields, key):
+                return dict.__getitem__(crossref_fields, key)
+            if key in crossref_entry.persons:
+                return ' and '.join(unicode(person) for person in crossref_entry.persons[key])
+        return None
+
+    def invalidate(self):
+        self._inherited = None
+        try:
+            invalidate_crossrefs = self.parent.collection.invalidate_crossrefs
+        except AttributeError:
+            # no collection yet, or no parent yet when unpickling
+            pass
+        else:
+            invalidate_crossrefs()
+
+
+class PersonDict(EntryDict):
+    """Entry persons.
+
+    Persons are inherited as fields by the entry itself and by the entries
+    cross-referencing it, so changing them invalidates inherited fields.
+    """
 
+    __slots__ = ()
 
-class Entry(object):
+    def invalidate(self):
+        try:
+            fields = self.parent.fields
+        except AttributeError:
+            # no parent yet when unpickling
+            pass
+        else:
+            fields.invalidate()
+
+
+class Entry(SlotsPickleMixin):
     """Bibliography entry. Important members are:
     - persons (a dict of Person objects)
     - fields (all dict of string)
     """
 
+    __slots__ = 'type', 'fields', 'persons', 'collection', 'key', '_vars'
+
     def __init__(self, type_, fields=None, persons=None, collection=None):
         if fields is None:
             fields = {}
@@ -232,11 +515,20 @@ class Entry(object):
             persons = {}
         self.type = type_
         self.fields = FieldDict(self, fields)
-        self.persons = dict(persons)
+        self.persons = PersonDict(self, persons)
         self.collection = collection
 
-        # for BibTeX interpreter
-        self.vars = {}
+    @property
+    def vars(self):
+        """Entry variables for the BibTeX interpreter.
+
+        The dict is only created when it is first used.
+        """
+        try:
+            return self._vars
+        except AttributeError:
+            self._vars = {}
+            return self._vars
 
     def __eq__(self, other):
         if not isinstance(other, Entry):
@@ -247,6 +539,9 @@ class Entry(object):
                 and self.persons == other.persons
         )
 
+    def __ne__(self, other):
+        return not self == other
+
     def __repr__(self):
         return 'Entry({type_}, fields={fields}, persons={persons})'.format(
             type_=repr(self.type),
@@ -257,11 +552,76 @@ class Entry(object):
     def get_crossref(self):
         return self.collection.entries[self.fields['crossref']]
 
+    def get_crossref_chain(self):
+        """Return the list of entries from which this entry inherits fields."""
+        if 'crossref' not in self.fields:
+            return ()
+        get_crossref_chain = getattr(self.collection, 'get_crossref_chain', None)
+        if get_crossref_chain is not None:
+            return get_crossref_chain(self.key)
+        return self.resolve_crossref_chain()
+
+    def resolve_crossref_chain(self, reported_cycles=None):
+        """Follow the crossref fields and return the list of entries found.
+
+        Cyclic and dangling cross-references end the chain. A cycle is
+        reported unless it is already in the reported_cycles set, to which
+        it is then added.
+        """
+        chain = []
+        seen = set([id(self)])
+        entry = self
+        while 'crossref' in entry.fields:
+            crossref = dict.__getitem__(entry.fields, 'crossref')
+            try:
+                entry = self.collection.entries[crossref]
+            except (KeyError, AttributeError):
+                break
+            if id(entry) in seen:
+                if reported_cycles is not None:
+                    path = [self] + chain
+                    cycle_start = [id(item) for item in path].index(id(entry))
+                    cycle = frozenset(id(item) for item in path[cycle_start:])
+                    if cycle in reported_cycles:
+                        break
+                    reported_cycles.add(cycle)
+                report_error(BibliographyDataError(
+                    'cyclic cross-reference: the crossref chain of entry "{key}" '
+                    'comes back to entry "{crossref}"'.format(
+                        key=self.key, crossref=crossref,
+                    )
+                ))
+                break
+            seen.add(id(entry))
+            chain.append(entry)
+        return chain
+
     def add_person(self, person, role):
         self.persons.setdefault(role, []).append(person)
+        self.fields.invalidate()
 
+    def split_persons(self, roles=None):
+        """Turn person fields stored as raw strings into Person objects.
 
-class Person(object):
+        >>> entry = Entry('book', {'author': 'Knuth, Donald E. and Lamport, Leslie'})
+        >>> entry.split_persons()
+        >>> print entry.fields.keys()
+        []
+        >>> print [unicode(person) for person in entry.persons['author']]
+        [u'Knuth, Donald E.', u'Lamport, Leslie']
+        """
+        if roles is None:
+            roles = Person.valid_roles
+        for role in roles:
+            try:
+                names = self.fields.pop(role)
+            except KeyError:
+                continue
+            for name in split_name_list(names):
+                self.add_person(Person(name), role)
+
+
+class Person(SlotsPickleMixin):
     """Represents a person (usually human).
 
     >>> p = Person('Avinash K. Dixit')
@@ -306,20 +666,64 @@ class Person(object):
     style1_re = re.compile('^(.+),\s*(.+)$')
     style2_re = re.compile('^(.+),\s*(.+),\s*(.+)$')
 
+    # name parts are stored as tuples, text is set by formatting styles
+    __slots__ = '_string', '_first', '_middle', '_prelast', '_last', '_lineage', 'text'
+    _parts = '_first', '_middle', '_prelast', '_last', '_lineage'
+
+    # parsed name parts, shared by all persons created from the same string
+    name_cache = LRUCache(max_size=50000, name='pybtex.database.Person.name_cache')
+
     def __init__(self, string="", first="", middle="", prelast="", last="", lineage=""):
-        self._first = []
-        self._middle = []
-        self._prelast = []
-        self._last = []
-        self._lineage = []
+        """Create a person.
+
+        If only the string is given, it is not parsed until one of the name
+        parts is accessed, see __getattr__(). Parsed names are kept in
+        name_cache, so each distinct string is parsed only once.
+
+        Names with more than two commas may be invalid, so they are parsed
+        right away to report the error as early as possible.
+
+        >>> Person('a, b, c, d')
+        Traceback (most recent call last):
+            ...
+        PybtexError: Invalid name format: a, b, c, d
+        """
         string = string.strip()
+        if string and not (first or middle or prelast or last or lineage) and string.count(',') <= 2:
+            self._string = string
+        else:
+            self._string = None
+            self._parse(string, first, middle, prelast, last, lineage)
+
+    def __getattr__(self, name):
+        # called only for name parts that have not been parsed yet
+        if name in self._parts and self._string is not None:
+            string = self._string
+            try:
+                parts = self.name_cache[string]
+            except KeyError:
+                self._parse(string)
+                self.name_cache[string] = (
+                    self._first, self._middle, self._prelast, self._last, self._lineage,
+                )
+            else:
+                self._first, self._middle, self._prelast, self._last, self._lineage = parts
+            self._string = None
+            return getattr(self, name)
+        raise AttributeError(name)
+
+    def _parse(self, string, first="", middle="", prelast="", last="", lineage=""):
+        # the name parts are set only if the string is parsed successfully,
+        # otherwise the error is raised again on the next access
         if string:
-            self.parse_string(string)
-        self._first.extend(split_tex_string(first))
-        self._middle.extend(split_tex_string(middle))
-        self._prelast.extend(split_tex_string(prelast))
-        self._last.extend(split_tex_string(last))
-        self._lineage.extend(split_tex_string(lineage))
+            parts = self.parse_string(string)
+        else:
+            parts = [], [], [], [], []
+        for part, extra_names in zip(parts, (first, middle, prelast, last, lineage)):
+            part.extend(split_tex_string(extra_names))
+        (
+            self._first, self._middle, self._prelast, self._last, self._lineage,
+        ) = [tuple(part) for part in parts]
 
     def parse_string(self, name):
         """Extract various parts of the name from a string.
@@ -328,11 +732,19 @@ class Person(object):
          - von Last, Jr, First
          - First von Last
         (see BibTeX manual for explanation)
+
+        Return a tuple of (first, middle, prelast, last, lineage) lists.
         """
+        first_names = []
+        middle_names = []
+        prelast_names = []
+        last_names = []
+        lineage_names = []
+
         def process_first_middle(parts):
             try:
-                self._first.append(parts[0])
-                self._middle.extend(parts[1:])
+                first_names.append(parts[0])
+                middle_names.extend(parts[1:])
             except IndexError:
                 pass
 
@@ -340,8 +752,8 @@ class Person(object):
             von, last = rsplit_at(parts, lambda part: part.islower())
             if von and not last:
                 last.append(von.pop())
-            self._prelast.extend(von)
-            self._last.extend(last)
+            prelast_names.extend(von)
+            last_names.extend(last)
 
         def find_pos(lst, pred):
             for i, item in enumerate(lst):
@@ -366,7 +778,7 @@ class Person(object):
         parts = split_tex_string(name, ',')
         if len(parts) == 3: # von Last, Jr, First
             process_von_last(split_tex_string(parts[0]))
-            self._lineage.extend(split_tex_string(parts[1]))
+            lineage_names.extend(split_tex_string(parts[1]))
             process_first_middle(split_tex_string(parts[2]))
         elif len(parts) == 2: # von Last, First
             process_von_last(split_tex_string(parts[0]))
@@ -381,6 +793,7 @@ class Person(object):
             process_von_last(von_last)
         else:
             raise PybtexError('Invalid name format: %s' % name)
+        return first_names, middle_names, prelast_names, last_names, lineage_names
 
     def __eq__(self, other):
         if not isinstance(other, Person):
@@ -393,6 +806,9 @@ class Person(object):
                 and self._lineage == other._lineage
         )
 
+    def __ne__(self, other):
+        return not self == other
+
     def __unicode__(self):
         # von Last, Jr, First
         von_last = ' '.join(self._prelast + self._last)
@@ -411,15 +827,15 @@ class Person(object):
         names = getattr(self, '_' + type)
         if abbr:
             from pybtex.textutils import abbreviate
-            names = [abbreviate(name) for name in names]
-        return names
+            return [abbreviate(name) for name in names]
+        return list(names)
 
     #FIXME needs some thinking and cleanup
     def bibtex_first(self):
         """Return first and middle names together.
         (BibTeX treats all middle names as first)
         """
-        return self._first + self._middle
+        return list(self._first + self._middle)
 
     def first(self, abbr=False):
         return self.get_part('first', abbr)
@@ -0,0 +1,325 @@
+# Copyright (c) 2012  Andrey Golovizin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Column-oriented storage for bibliography data.
+
+Field values are stored as arrays of integer codes into a shared string
+table, one array per field. Bulk queries look at the codes only, and
+predicates are called once per distinct value instead of once per entry.
+
+>>> from pybtex.database import BibliographyData, Entry, Person
+>>> data = ColumnarBibliographyData([
+...     ('knuth1984', Entry('book',
+...         {'title': 'The TeXbook', 'year': '1984'},
+...         persons={'author': [Person('Knuth, Donald E.')]},
+...     )),
+...     ('lamport1986', Entry('book', {'title': 'LaTeX', 'year': '1986'})),
+...     ('knuth1986', Entry('article', {'title': 'Remarks', 'year': '1986', 'doi': '10.1000/1'})),
+... ])
+>>> len(data)
+3
+>>> data.column('year')
+['1984', '1986', '1986']
+>>> data.column('doi')
+[None, None, '10.1000/1']
+>>> data.filter(year='1986').keys
+['lamport1986', 'knuth1986']
+>>> data.filter(doi=True).keys
+['knuth1986']
+>>> data.filter(doi=None, entry_type='book').keys
+['knuth1984', 'lamport1986']
+>>> data.filter(year=lambda year: int(year) < 1985).keys
+['knuth1984']
+>>> data.filter(year=['1984', '1985']).keys
+['knuth1984']
+>>> sorted(data.count_by('year').items())
+[('1984', 1), ('1986', 2)]
+>>> for year, group in data.group_by('year'):
+...     print year, group.keys
+1984 ['knuth1984']
+1986 ['lamport1986', 'knuth1986']
+>>> sorted(data.project('title').fields)
+['title']
+
+The entries view builds Entry objects on access:
+
+>>> entry = data.entries['Knuth1984']
+>>> print entry.type, entry.fields['title']
+book The TeXbook
+>>> print unicode(entry.persons['author'][0])
+Knuth, Donald E.
+>>> list(data.entries)
+['knuth1984', 'lamport1986', 'knuth1986']
+>>> data.to_bibliography_data() == BibliographyData(data.entries)
+True
+
+"""
+
+from array import array
+from collections import Mapping, Counter
+
+from pybtex.database import BibliographyData, BibliographyDataError, Entry
+from pybtex.errors import report_error
+
+
+class StringTable(object):
+    """Map strings to integer codes and back.
+
+    Code 0 stands for a missing value.
+    """
+
+    def __init__(self):
+        self.strings = [None]
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, code):
+        return self.strings[code]
+
+    def get_code(self, string):
+        try:
+            return self.codes[string]
+        except KeyError:
+            code = self.codes[string] = len(self.strings)
+            self.strings.append(string)
+            return code
+
+
+class ColumnarEntries(Mapping):
+    """A read-only case-insensitive mapping of keys to Entry objects."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def __len__(self):
+        return len(self.data.keys)
+
+    def __iter__(self):
+        return iter(self.data.keys)
+
+    def __contains__(self, key):
+        return key.lower() in self.data.rows
+
+    def __getitem__(self, key):
+        try:
+            row = self.data.rows[key.lower()]
+        except KeyError:
+            raise KeyError(key)
+        return self.data.make_entry(row)
+
+
+class ColumnarBibliographyData(object):
+    """Bibliography data stored by columns.
+
+    keys is the list of entry keys, types is an array of entry type codes,
+    fields maps field names to arrays of value codes, and persons maps
+    person roles to lists of person tuples (or None). All codes refer to
+    the string table.
+    """
+
+    def __init__(self, entries=None, preamble=None, string_table=None):
+        self.strings = string_table or StringTable()
+        self.keys = []
+        self.rows = {}
+        self.types = array('i')
+        self.fields = {}
+        self.persons = {}
+        self._preamble = []
+        self.entries = ColumnarEntries(self)
+        if entries:
+            if isinstance(entries, Mapping):
+                entries = entries.iteritems()
+            for key, entry in entries:
+                self.add_entry(key, entry)
+        if preamble:
+            self._preamble.extend(preamble)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __repr__(self):
+        return 'ColumnarBibliographyData(keys={keys}, fields={fields})'.format(
+            keys=repr(self.keys),
+            fields=repr(sorted(self.fields)),
+        )
+
+    def add_to_preamble(self, *values):
+        self._preamble.extend(values)
+
+    def preamble(self):
+        return ''.join(self._preamble)
+
+    def add_entry(self, key, entry):
+        key_lower = key.lower()
+        if key_lower in self.rows:
+            report_error(BibliographyDataError('repeated bibliography entry: %s' % key))
+            return
+        row = len(self.keys)
+        get_code = self.strings.get_code
+        self.rows[key_lower] = row
+        self.keys.append(key)
+        self.types.append(get_code(entry.type))
+        for field_name, value in entry.fields.iteritems():
+            column = self.fields.get(field_name)
+            if column is None:
+                column = self.fields[field_name] = array('i', [0]) * row
+            column.append(get_code(value))
+        for role, persons in entry.persons.iteritems():
+            column = self.persons.get(role)
+            if column is None:
+                column = self.persons[role] = [None] * row
+            column.append(tuple(persons))
+        for column in self.fields.itervalues():
+            if len(column) == row:
+                column.append(0)
+        for column in self.persons.itervalues():
+            if len(column) == row:
+                column.append(None)
+
+    def make_entry(self, row):
+        strings = self.strings
+        entry = Entry(
+            strings[self.types[row]],
+            fields=dict(
+                (field_name, strings[column[row]])
+                for field_name, column in self.fields.iteritems()
+                if column[row]
+            ),
+            persons=dict(
+                (role, list(column[row]))
+                for role, column in self.persons.iteritems()
+                if column[row] is not None
+            ),
+            collection=self,
+        )
+        entry.key = self.keys[row]
+        return entry
+
+    def to_bibliography_data(self):
+        return BibliographyData(self.entries, preamble=self._preamble)
+
+    def column(self, field_name):
+        """Return the list of values of a field (None for missing values)."""
+        try:
+            column = self.fields[field_name]
+        except KeyError:
+            return [None] * len(self)
+        strings = self.strings
+        return [strings[code] for code in column]
+
+    def take(self, rows):
+        """Return a new ColumnarBibliographyData with the given rows only."""
+        result = type(self)(preamble=self._preamble, string_table=self.strings)
+        result.keys = [self.keys[row] for row in rows]
+        result.rows = dict((key.lower(), row) for row, key in enumerate(result.keys))
+        result.types = array('i', [self.types[row] for row in rows])
+        result.fields = dict(
+            (field_name, array('i', [column[row] for row in rows]))
+            for field_name, column in self.fields.iteritems()
+        )
+        result.persons = dict(
+            (role, [column[row] for row in rows])
+            for role, column in self.persons.iteritems()
+        )
+        return result
+
+    def project(self, *field_names):
+        """Return a copy with only the given fields and person roles."""
+        result = self.take(xrange(len(self)))
+        result.fields = dict(
+            (field_name, column) for field_name, column in result.fields.iteritems()
+            if field_name in field_names
+        )
+        result.persons = dict(
+            (role, column) for role, column in result.persons.iteritems()
+            if role in field_names
+        )
+        return result
+
+    def filter(self, conditions=None, entry_type=None, **field_conditions):
+        """Return a new ColumnarBibliographyData with the matching entries.
+
+        Conditions map field names to:
+        - a string, matching this value exactly;
+        - a number, matching its string representation (year=1997 matches
+          u'1997');
+        - a list, tuple or set of strings or numbers, matching any of them;
+        - a callable, called once for each distinct value of the field;
+        - True or None, matching entries with or without the field.
+        """
+        conditions = dict(conditions or (), **field_conditions)
+        rows = xrange(len(self))
+        if entry_type is not None:
+            rows = self.select(self.types, entry_type, rows)
+        for field_name, condition in conditions.iteritems():
+            column = self.fields.get(field_name)
+            if column is None:
+                column = array('i', [0]) * len(self)
+            rows = self.select(column, condition, rows)
+        return self.take(rows)
+
+    def select(self, column, condition, rows):
+        """Return the rows where the column value matches the condition."""
+        if condition is True:
+            return [row for row in rows if column[row]]
+        if condition is None:
+            codes = set([0])
+        elif callable(condition):
+            strings = self.strings
+            codes = set(code for code in set(column) if code and condition(strings[code]))
+        else:
+            if not isinstance(condition, (list, tuple, set, frozenset)):
+                condition = [condition]
+            string_codes = self.strings.codes
+            codes = set()
+            for value in condition:
+                if not isinstance(value, basestring):
+                    value = unicode(value)
+                if value in string_codes:
+                    codes.add(string_codes[value])
+        return [row for row in rows if column[row] in codes]
+
+    def count_by(self, field_name):
+        """Return a dict mapping the values of a field to entry counts."""
+        strings = self.strings
+        column = self.fields.get(field_name, [0] * len(self))
+        return dict(
+            (strings[code], count) for code, count in Counter(column).iteritems()
+        )
+
+    def group_by(self, field_name):
+        """Return a list of (value, ColumnarBibliographyData) pairs.
+
+        Groups are listed in the order in which the values first appear.
+        """
+        column = self.fields.get(field_name, [0] * len(self))
+        groups = {}
+        order = []
+        for row, code in enumerate(column):
+            try:
+                groups[code].append(row)
+            except KeyError:
+                groups[code] = [row]
+                order.append(code)
+        strings = self.strings
+        return [(strings[code], self.take(groups[code])) for code in order]
@@ -31,7 +31,7 @@ class PybtexConvertCommandLine(CommandLine):
     long_description = """
 
 pybtex-convert converts bibliography database files between supported formats
-(currently BibTeX, BibTeXML and YAML).
+(currently BibTeX, BibTeXML, YAML and Pybtex' binary format).
 
     """.strip()
 
@@ -54,6 +54,19 @@ pybtex-convert converts bibliography database files between supported formats
                 action='store_true', dest='keyless_entries',
                 help='allow BibTeX entries without keys and generate unnamed-<number> keys for them'
             ),
+            make_option(
+                '--raw-bibtex-names',
+                action='store_true', dest='raw_persons',
+                help='do not parse names in BibTeX author and editor fields, copy them as they are'
+            ),
+            make_option(
+                '--parse-cache', dest='parse_cache', action='store_true',
+                help='cache parsed input files on disk (in $PYBTEX_CACHE_DIR or ~/.cache/pybtex)',
+            ),
+            make_option(
+                '--no-parse-cache', dest='parse_cache', action='store_false',
+                help='do not use the parse cache (default)',
+            ),
         )),
         ('encoding options', (
             make_option(
@@ -76,6 +89,8 @@ pybtex-convert converts bibliography database files between supported formats
     )
     option_defaults = {
         'keyless_entries': False,
+        'raw_persons': False,
+        'parse_cache': False,
     }
 
     def run(self, options, args):
@@ -86,7 +101,11 @@ pybtex-convert converts bibliography database files between supported formats
                 options.to_format,
                 input_encoding=options.input_encoding or options.encoding,
                 output_encoding=options.output_encoding or options.encoding,
-                parser_options = {'keyless_entries': options.keyless_entries})
+                parser_options = {
+                    'keyless_entries': options.keyless_entries,
+                    'raw_persons': options.raw_persons,
+                    'cache': options.parse_cache,
+                })
 
 main = PybtexConvertCommandLine()
 
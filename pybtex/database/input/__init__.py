@@ -22,11 +22,19 @@
 from __future__ import with_statement
 
 from os import path
+from copy import copy
+from itertools import izip
 
 import pybtex.io
+from pybtex import errors
 from pybtex.plugin import Plugin
 from pybtex.database import BibliographyData
-from pybtex.exceptions import PybtexError
+from pybtex.exceptions import PybtexError, FormattedError
+
+
+def _run_job(args):
+    parser, job = args
+    return parser.run_job(job)
 
 
 class BaseParser(Plugin):
@@ -35,8 +43,20 @@ class BaseParser(Plugin):
 
     unicode_io = False
 
-    def __init__(self, encoding=None, wanted_entries=None, min_crossrefs=2, **kwargs):
+    def __init__(self, encoding=None, wanted_entries=None, min_crossrefs=2, processes=None, cache=None, **kwargs):
+        """
+        If processes is greater than 1, parse_files() parses the files in a
+        pool of that many worker processes.
+
+        If cache is True, parsed files are stored in the default on-disk
+        cache (see pybtex.cache). A FileCache object may be passed instead.
+        """
         self.encoding = encoding or pybtex.io.get_default_encoding()
+        self.processes = processes
+        if cache is True:
+            from pybtex.cache import FileCache
+            cache = FileCache()
+        self.cache = cache
         self.data = BibliographyData(
             wanted_entries=wanted_entries,
             min_crossrefs=min_crossrefs,
@@ -46,6 +66,9 @@ class BaseParser(Plugin):
         if file_suffix is not None:
             filename = filename + file_suffix
         self.filename = filename
+        if self.cache:
+            self.parse_file_cached(filename)
+            return self.data
         open_file = pybtex.io.open_unicode if self.unicode_io else pybtex.io.open_raw
         with open_file(filename, encoding=self.encoding) as f:
             try:
@@ -54,10 +77,101 @@ class BaseParser(Plugin):
                 raise PybtexError(unicode(e), filename=self.filename)
         return self.data
 
+    def parse_file_cached(self, filename):
+        """Parse the file or load the parsing results from the cache.
+
+        By default, the cached results do not depend on the set of wanted
+        entries: all entries are stored, and they are filtered by
+        merge_job_result(). Parsers that skip unwanted entries while parsing
+        add the wanted entries to the cache key (see get_cache_key()).
+        """
+        from pybtex.cache import get_content_hash
+
+        with pybtex.io.open_raw(filename) as f:
+            content = f.read()
+        key = self.get_cache_key(get_content_hash(content))
+        result = self.cache.load(key)
+        job = self.make_cache_job(filename, content)
+        if result is None:
+            result = self.make_worker().run_job(job)
+            self.cache.save(key, result)
+        self.merge_job_result(job, result)
+
+    def get_cache_key(self, content_hash):
+        """Return the cache key for a file with the given content.
+
+        Subclasses should add all parser options affecting the result.
+        """
+        return (
+            type(self).__module__, type(self).__name__,
+            content_hash, self.encoding,
+        )
+
+    def make_cache_job(self, filename, content):
+        return filename
+
     def parse_files(self, base_filenames, file_suffix=None):
+        if self.processes > 1:
+            filenames = [
+                filename + file_suffix if file_suffix is not None else filename
+                for filename in base_filenames
+            ]
+            return self.parse_files_parallel(filenames)
         for filename in base_filenames:
             self.parse_file(filename, file_suffix)
         return self.data
 
+    def parse_files_parallel(self, filenames):
+        """Parse the files in a pool of worker processes.
+
+        Each file is split into one or more jobs by make_jobs(). The jobs
+        are run by run_job() in worker processes, and the results are merged
+        into self.data by merge_job_result() in the original order, so that
+        the result is the same as with sequential parsing.
+        """
+        from multiprocessing import Pool
+
+        jobs = []
+        for filename in filenames:
+            jobs.extend(self.make_jobs(filename))
+        worker = self.make_worker()
+        pool = Pool(self.processes)
+        try:
+            results = pool.imap(_run_job, [(worker, job) for job in jobs])
+            for job, result in izip(jobs, results):
+                self.merge_job_result(job, result)
+        finally:
+            pool.terminate()
+        return self.data
+
+    def make_jobs(self, filename):
+        """Return a list of picklable jobs for parsing the given file."""
+        return [filename]
+
+    def make_worker(self):
+        """Return a copy of the parser to be sent to the worker processes.
+
+        Entries are filtered by the main process, as the set of wanted
+        entries depends on the crossrefs found in all files.
+        """
+        worker = copy(self)
+        worker.processes = None
+        worker.cache = None
+        worker.data = BibliographyData(min_crossrefs=self.data.min_crossrefs)
+        return worker
+
+    def run_job(self, filename):
+        with errors.collect() as report:
+            self.parse_file(filename)
+        job_errors = [FormattedError.from_error(error) for error in report]
+        return list(self.data.entries.iteritems()), self.data._preamble, job_errors
+
+    def merge_job_result(self, filename, result):
+        entries, preamble, job_errors = result
+        for error in job_errors:
+            errors.report_error(error)
+        self.data.add_entries(entries)
+        self.data.add_to_preamble(*preamble)
+
     def parse_stream(self, stream):
         raise NotImplementedError
@@ -0,0 +1,175 @@
+# Copyright (c) 2012  Andrey Golovizin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Compact binary bibliography format (see pybtex.database.output.bibbin).
+"""
+
+import sys
+import struct
+from array import array
+from heapq import heappush, heappop
+
+from pybtex.database.input import BaseParser
+from pybtex.database import Entry, Person
+from pybtex.database.output.bibbin import MAGIC, FORMAT_VERSION, HEADER, UNPARSED_PERSON
+from pybtex.exceptions import PybtexError
+
+
+def read_integers(data, start, count):
+    integers = array('i')
+    integers.fromstring(data[start:start + count * integers.itemsize])
+    if sys.byteorder != 'little':
+        integers.byteswap()
+    return integers
+
+
+class Parser(BaseParser):
+    name = 'bibbin'
+    aliases = 'binary',
+    suffixes = '.bibbin',
+
+    def parse_stream(self, stream):
+        data = stream.read()
+        try:
+            self.load(data)
+        except (struct.error, ValueError, IndexError, EOFError):
+            raise PybtexError('corrupted binary bibliography file', filename=self.filename)
+        return self.data
+
+    def load(self, data):
+        magic, version, num_strings, string_data_size, num_integers, index_pos = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise PybtexError('not a binary bibliography file', filename=self.filename)
+        if version != FORMAT_VERSION:
+            raise PybtexError(
+                'unsupported binary bibliography format version: {0}'.format(version),
+                filename=self.filename,
+            )
+        pos = HEADER.size
+        lengths = read_integers(data, pos, num_strings)
+        pos += num_strings * lengths.itemsize
+        self.strings = strings = []
+        append = strings.append
+        for length in lengths:
+            end = pos + length
+            append(data[pos:end].decode('UTF-8'))
+            pos = end
+        if pos != HEADER.size + num_strings * lengths.itemsize + string_data_size:
+            raise ValueError
+        self.integers = integers = read_integers(data, pos, num_integers).tolist()
+        if len(integers) != num_integers:
+            raise EOFError
+
+        num_preamble = integers[0]
+        self.data.add_to_preamble(*[strings[code] for code in integers[1:num_preamble + 1]])
+        first_record = num_preamble + 2
+        wanted_entries = self.data.wanted_entries
+        if index_pos and wanted_entries is not None and '*' not in wanted_entries:
+            self.load_wanted_entries(index_pos)
+        else:
+            self.load_entries(first_record, integers[first_record - 1])
+        del self.strings, self.integers
+
+    def load_entries(self, pos, num_entries):
+        """Load the records one by one, skipping the unwanted entries."""
+        integers = self.integers
+        strings = self.strings
+        want_entry = self.data.want_entry
+        add_entry = self.data.add_entry
+        for i in xrange(num_entries):
+            key = strings[integers[pos + 1]]
+            if want_entry(key):
+                add_entry(key, self.make_entry(pos + 2))
+            pos += integers[pos] + 1
+
+    def load_wanted_entries(self, index_pos):
+        """Load the wanted entries found with the key index.
+
+        Entries are loaded in the file order. Entries cross-referenced by
+        the loaded ones may become wanted in the process (see
+        BibliographyData.count_crossref()), so they are looked up as well.
+        The result is the same as with load_entries().
+        """
+        integers = self.integers
+        strings = self.strings
+        num_keys = integers[index_pos]
+        positions = dict(
+            (strings[integers[i]].lower(), integers[i + 1])
+            for i in xrange(index_pos + 1, index_pos + 1 + 2 * num_keys, 2)
+        )
+
+        queue = []
+        queued = set()
+        def enqueue(key, after=-1):
+            pos = positions.get(key.lower())
+            if pos is not None and pos > after and pos not in queued:
+                heappush(queue, pos)
+                queued.add(pos)
+
+        for key in self.data.wanted_entries:
+            enqueue(key)
+        while queue:
+            pos = heappop(queue)
+            key = strings[integers[pos + 1]]
+            if not self.data.want_entry(key):
+                continue
+            entry = self.make_entry(pos + 2)
+            self.data.add_entry(key, entry)
+            crossref = dict.get(entry.fields, 'crossref')
+            if crossref is not None and self.data.want_entry(crossref):
+                enqueue(crossref, pos)
+
+    def make_entry(self, pos):
+        integers = self.integers
+        strings = self.strings
+        type_ = strings[integers[pos]]
+        end = pos + 2 + 2 * integers[pos + 1]
+        fields = [
+            (strings[integers[i]], strings[integers[i + 1]])
+            for i in xrange(pos + 2, end, 2)
+        ]
+        pos = end + 1
+        persons = {}
+        for i in xrange(integers[end]):
+            role_persons = persons[strings[integers[pos]]] = []
+            num_persons = integers[pos + 1]
+            pos += 2
+            for j in xrange(num_persons):
+                pos = self.make_person(pos, role_persons)
+        return Entry(type_, fields, persons)
+
+    def make_person(self, pos, persons):
+        integers = self.integers
+        strings = self.strings
+        if integers[pos] == UNPARSED_PERSON:
+            persons.append(Person(strings[integers[pos + 1]]))
+            return pos + 2
+        person = Person.__new__(Person)
+        person._string = None
+        parts = []
+        start = pos + 5
+        for length in integers[pos:pos + 5]:
+            end = start + length
+            parts.append(tuple([strings[code] for code in integers[start:end]]))
+            start = end
+        person._first, person._middle, person._prelast, person._last, person._lineage = parts
+        persons.append(person)
+        return start
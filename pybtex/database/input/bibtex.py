@@ -59,14 +59,24 @@ Gaub, Hermann E.
 
 """
 
-from string import ascii_letters, digits
+from __future__ import with_statement
 
+import os
 import re
+import codecs
+import cPickle as pickle
+from bisect import bisect_left, bisect_right
+from mmap import mmap, ACCESS_READ
+from stat import S_IMODE
+from string import ascii_letters, digits
+from tempfile import mkstemp
+
 import pybtex.io
+from pybtex.__version__ import version
 from pybtex.database import Entry, Person
 from pybtex.database.input import BaseParser
 from pybtex.bibtex.utils import split_name_list
-from pybtex.exceptions import PybtexError
+from pybtex.exceptions import PybtexError, FormattedError
 from pybtex import textutils
 from pybtex.scanner import (
     Scanner, Pattern, Literal,
@@ -90,8 +100,14 @@ month_names = {
 
 
 class Macro(object):
-    def __init__(self, name):
+    """A reference to a macro which could not be substituted yet.
+
+    error is the error to report if the macro turns out to be undefined.
+    """
+
+    def __init__(self, name, error=None):
         self.name = name
+        self.error = error
 
     def __repr__(self):
         return 'Macro({0})'.format(self.name)
@@ -119,6 +135,14 @@ class BibTeXEntryIterator(Scanner):
     EQUALS = Literal(u'=')
     HASH = Literal(u'#')
     AT = Literal(u'@')
+    BRACE_BODY_DELIMITERS = Pattern(ur'[{}]', 'brace')
+    # the rest of an entry body with braces nested at most three levels deep
+    BRACE_BODY_REST = Pattern(reduce(
+        lambda inner, _: ur'[^{{}}]*(?:\{{{0}\}}[^{{}}]*)*'.format(inner),
+        range(3), ur'[^{}]*',
+    ) + ur'\}', 'entry body')
+    PAREN_BODY_DELIMITERS = Pattern(ur'[{}")]', 'brace, quote or parenthesis')
+    LINE_START_AT = Pattern(ur'^[ \t]*@', 'line-initial @', re.MULTILINE)
 
     command_start = None
     current_command = None
@@ -126,10 +150,17 @@ class BibTeXEntryIterator(Scanner):
     current_fields = None
     current_field_name = None
     current_field_value = None
+    line_start_ats = None
 
-    def __init__(self, text, keyless_entries=False, macros=month_names, handle_error=None, want_entry=None, filename=None):
-        super(BibTeXEntryIterator, self).__init__(text, filename)
+    def __init__(self, text, keyless_entries=False, macros=month_names, handle_error=None, want_entry=None, filename=None, stream=None, chunk_size=None, resync_at_line_start=False):
+        """
+        After a syntax error, parsing resumes at the next @ character. If
+        resync_at_line_start is True, it resumes at the next @ at the
+        beginning of a line (possibly indented) instead.
+        """
+        super(BibTeXEntryIterator, self).__init__(text, filename, stream, chunk_size)
         self.keyless_entries = keyless_entries
+        self.resync_at_line_start = resync_at_line_start
         self.macros = dict(macros)
         if handle_error:
             self.handle_error = handle_error
@@ -139,19 +170,38 @@ class BibTeXEntryIterator(Scanner):
     def __iter__(self):
         return self.parse_bibliography()
 
+    def discard_pos(self):
+        if self.command_start is None:
+            return self.pos
+        return self.command_start - self.offset
+
     def get_error_context_info(self):
-        return self.command_start, self.lineno, self.pos
+        return self.command_start, self.lineno, self.offset + self.pos
 
     def get_error_context(self, context_info):
         error_start, lineno, error_pos  = context_info
-        before_error = self.text[error_start:error_pos]
+        if error_start < self.offset:
+            # the text was already dropped from the stream buffer
+            return None, lineno, None
+        before_error = self.text[error_start - self.offset:error_pos - self.offset]
         if not before_error.endswith('\n'):
-            eol = self.NEWLINE.search(self.text, error_pos)
+            while True:
+                eol = self.NEWLINE.search(self.text, error_pos - self.offset)
+                if eol or not self.read_more():
+                    break
             error_end = eol.end() if eol else self.end_pos
         else:
-            error_end = error_pos
-        context = self.text[error_start:error_end].rstrip('\r\n')
-        colno = len(before_error.splitlines()[-1])
+            error_end = error_pos - self.offset
+        context = self.text[error_start - self.offset:error_end].rstrip('\r\n')
+        # the length of the last line of before_error
+        if before_error.endswith('\r\n'):
+            line_end = len(before_error) - 2
+        elif before_error.endswith(('\n', '\r')):
+            line_end = len(before_error) - 1
+        else:
+            line_end = len(before_error)
+        line_start = max(before_error.rfind('\n', 0, line_end), before_error.rfind('\r', 0, line_end)) + 1
+        colno = line_end - line_start
         return context, lineno, colno
 
     def handle_error(self, error):
@@ -162,16 +212,54 @@ class BibTeXEntryIterator(Scanner):
 
     def parse_bibliography(self):
         while True:
+            self.command_start = None
             if not self.skip_to([self.AT]):
                 return
-            self.command_start = self.pos - 1
+            self.command_start = self.offset + self.pos - 1
             try:
                 yield tuple(self.parse_command())
             except PybtexSyntaxError as error:
                 self.handle_error(error)
+                self.resync()
             except SkipEntry:
                 pass
 
+    def resync(self):
+        """Skip to the next line-initial @ after a syntax error.
+
+        If the whole text is in the buffer, the positions of all line-initial
+        @ characters are found on the first call, so that the subsequent
+        calls do not have to scan the text again.
+        """
+        if not self.resync_at_line_start:
+            return
+        if self.stream is None:
+            if self.line_start_ats is None:
+                self.line_start_ats = [
+                    match.end() - 1 for match in self.LINE_START_AT.finditer(self.text)
+                ]
+            next_at = bisect_left(self.line_start_ats, self.pos)
+            if next_at < len(self.line_start_ats):
+                self.pos = self.line_start_ats[next_at]
+            else:
+                self.pos = self.end_pos
+            return
+        while True:
+            # search from the beginning of the current line, as the @ at
+            # self.pos may be preceded by indentation
+            line_start = max(self.text.rfind('\n', 0, self.pos), self.text.rfind('\r', 0, self.pos)) + 1
+            match = self.LINE_START_AT.search(self.text, line_start or self.pos)
+            while match and match.end() - 1 < self.pos:
+                match = self.LINE_START_AT.search(self.text, match.end())
+            if match:
+                self.pos = match.end() - 1
+                return
+            # keep the last line in the buffer, it may continue in the next chunk
+            self.pos = max(self.pos, self.text.rfind('\n'), self.text.rfind('\r'))
+            if not self.read_more():
+                self.pos = self.end_pos
+                return
+
     def parse_command(self):
         self.current_command = None
         self.current_entry_key = None
@@ -200,6 +288,7 @@ class BibTeXEntryIterator(Scanner):
             self.required([body_end])
         except PybtexSyntaxError, error:
             self.handle_error(error)
+            self.resync()
         return make_result()
 
     def parse_preamble_body(self, body_end):
@@ -216,9 +305,52 @@ class BibTeXEntryIterator(Scanner):
             key_pattern = self.KEY_PAREN if body_end == self.RPAREN else self.KEY_BRACE
             self.current_entry_key = self.required([key_pattern]).value
             if not self.want_entry(self.current_entry_key):
+                self.skip_entry_body(body_end)
                 raise SkipEntry
         self.parse_entry_fields()
 
+    def skip_entry_body(self, body_end):
+        """Skip the rest of an unwanted entry without parsing its fields.
+
+        Only braces (and, in parenthesized entries, quotes and the closing
+        parenthesis) are looked at, so @ characters inside field values
+        are skipped too. If the body is not terminated, skip nothing and let
+        parse_bibliography() resume at the next @.
+        """
+        start_pos = self.offset + self.pos
+        if body_end is self.RBRACE:
+            match = self.BRACE_BODY_REST.match(self.text, self.pos)
+            if match:
+                self.pos = match.end()
+                return
+            delimiters = self.BRACE_BODY_DELIMITERS
+        else:
+            delimiters = self.PAREN_BODY_DELIMITERS
+        level = 0
+        in_quotes = False
+        while True:
+            match = delimiters.search(self.text, self.pos)
+            if not match:
+                self.pos = self.end_pos
+                if self.read_more():
+                    continue
+                self.pos = start_pos - self.offset
+                return
+            self.pos = match.end()
+            char = match.group()
+            if char == u'{':
+                level += 1
+            elif char == u'}':
+                if level:
+                    level -= 1
+                elif body_end is self.RBRACE:
+                    return
+            elif level == 0:
+                if char == u'"':
+                    in_quotes = not in_quotes
+                elif not in_quotes:
+                    return
+
     def parse_entry_fields(self):
         while True:
             self.current_field_name = None
@@ -295,40 +427,443 @@ class BibTeXEntryIterator(Scanner):
                 raise PybtexSyntaxError('unbalanced braces', self)
 
 
+class BytesEntryIterator(BibTeXEntryIterator):
+    """Parse an encoded byte string (or an mmap object) without decoding it.
+
+    Only the keys, field names and values of the parsed commands are
+    decoded. This only works for ASCII-compatible encodings in which all
+    bytes of non-ASCII characters are non-ASCII, like UTF-8.
+    """
+
+    def __init__(self, text, encoding, **kwargs):
+        super(BytesEntryIterator, self).__init__(text, **kwargs)
+        self.encoding = encoding
+        want_entry = self.want_entry
+        self.want_entry = lambda key: want_entry(key.decode(encoding))
+
+    def parse_bibliography(self):
+        encoding = self.encoding
+        for command, args in super(BytesEntryIterator, self).parse_bibliography():
+            if command == 'preamble':
+                args = self.decode_value(args[0]),
+            else:
+                name, value = args
+                if command == 'string':
+                    value = self.decode_value(value)
+                else:
+                    value = [(field_name.decode(encoding), self.decode_value(field_value)) for field_name, field_value in value]
+                args = (name.decode(encoding) if name is not None else None), value
+            yield command.decode(encoding), args
+
+    def decode_value(self, value_list):
+        return [
+            part.decode(self.encoding) if isinstance(part, str) else part
+            for part in value_list
+        ]
+
+    def flatten_string(self, parts):
+        return super(BytesEntryIterator, self).flatten_string(parts).decode(self.encoding)
+
+    def get_error_context(self, context_info):
+        context, lineno, colno = super(BytesEntryIterator, self).get_error_context(context_info)
+        if context is not None:
+            colno = len(context[:colno].decode(self.encoding, 'replace'))
+            context = context.decode(self.encoding, 'replace')
+        return context, lineno, colno
+
+
+class Shard(object):
+    """A part of a .bib file to be parsed in a worker process.
+
+    start is the position of the shard text in the file.
+    """
+
+    def __init__(self, filename, text, start, lineno, redefined_macros, is_first, is_last):
+        self.filename = filename
+        self.text = text
+        self.start = start
+        self.lineno = lineno
+        self.redefined_macros = redefined_macros
+        self.is_first = is_first
+        self.is_last = is_last
+
+
+class StopShard(Exception):
+    pass
+
+
+class ShardEntryIterator(BibTeXEntryIterator):
+    """Parse a shard into a list of records to be merged by Parser.
+
+    Errors are stored as FormattedError objects. Errors from the body of a
+    keyed entry are attached to the entry record, as they are only reported
+    if the entry is wanted.
+
+    Macros that may be (re)defined in the preceding shards are not
+    substituted. Macro placeholders are left in the values instead.
+
+    Unwanted entries are skipped as by the sequential parser, and their
+    positions are recorded, as they may turn out to be wanted because of
+    cross-references from the preceding shards. After a syntax error, or if
+    an unwanted entry can not be skipped, the parser might resume at a
+    different position with the rest of the file available. The shard is
+    not parsed any further then, and Parser.merge_job_result() parses the
+    rest of the file sequentially, starting with the failed command.
+    """
+
+    command_record_count = 0
+
+    def __init__(self, shard, **kwargs):
+        super(ShardEntryIterator, self).__init__(shard.text, filename=shard.filename, **kwargs)
+        self.base_lineno = shard.lineno
+        self.unresolved_macros = set(shard.redefined_macros)
+        self.records = []
+        self.entry_errors = []
+
+    def parse_bibliography(self):
+        try:
+            for command in super(ShardEntryIterator, self).parse_bibliography():
+                yield command
+        except StopShard:
+            pass
+
+    def parse_command(self):
+        self.command_record_count = len(self.records)
+        return super(ShardEntryIterator, self).parse_command()
+
+    def resync(self):
+        self.stop()
+
+    def skip_entry_body(self, body_end):
+        body_start = self.pos
+        super(ShardEntryIterator, self).skip_entry_body(body_end)
+        if self.pos == body_start:
+            # the end of the entry may be in the next shards
+            self.stop()
+        self.records.append(('skipped', self.current_entry_key, self.command_start, self.pos))
+
+    def stop(self):
+        """Forget the records of the current command and stop parsing."""
+        del self.records[self.command_record_count:]
+        self.entry_errors = []
+        self.records.append(('sequential', self.command_start))
+        raise StopShard
+
+    def handle_error(self, error):
+        error = FormattedError.from_error(error)
+        if self.current_entry_key is None:
+            self.records.append(('error', error))
+        else:
+            self.entry_errors.append(error)
+
+    def substitute_macro(self, name):
+        if name.lower() in self.unresolved_macros:
+            return Macro(name, FormattedError.from_error(UndefinedMacro(name, self)))
+        return super(ShardEntryIterator, self).substitute_macro(name)
+
+    def parse_string_body(self, body_end):
+        name = self.current_field_name = self.required([self.NAME]).value.lower()
+        self.required([self.EQUALS])
+        self.parse_value()
+        if has_macros(self.current_value):
+            self.unresolved_macros.add(name)
+        else:
+            self.unresolved_macros.discard(name)
+            self.macros[name] = ''.join(self.current_value)
+        self.records.append(('string', name, self.current_value))
+
+    def pop_entry_errors(self):
+        entry_errors = self.entry_errors
+        self.entry_errors = []
+        return entry_errors
+
+
+def has_macros(value_list):
+    return any(isinstance(part, Macro) for part in value_list)
+
+
+LINE_START_AT = re.compile(ur'^@', re.MULTILINE)
+STRING_COMMAND = re.compile(
+    ur'@\s*string\s*[{{(]\s*({0})'.format(BibTeXEntryIterator.NAME.regexp.pattern),
+    re.IGNORECASE,
+)
+
+def split_bibliography(text, shard_size):
+    r"""Split BibTeX source into parts of about shard_size characters.
+
+    The text is only split before an @ at the beginning of a line, and only
+    if the braces and parentheses before it are balanced, so that all
+    commands stay intact.
+
+    >>> text = u'@a{x}\n@b{y,\n@c{z}}\n@d(\n@e)\n@f{}'
+    >>> split_bibliography(text, 1)
+    [u'@a{x}\n', u'@b{y,\n@c{z}}\n', u'@d(\n@e)\n', u'@f{}']
+    >>> split_bibliography(text, 100)
+    [u'@a{x}\n@b{y,\n@c{z}}\n@d(\n@e)\n@f{}']
+
+    """
+
+    shards = []
+    start = 0
+    checked_pos = 0
+    depth = 0
+    pos = shard_size
+    while pos < len(text):
+        match = LINE_START_AT.search(text, pos)
+        if not match:
+            break
+        split_pos = match.start()
+        for open_char, close_char in '{}', '()':
+            depth += (
+                text.count(open_char, checked_pos, split_pos)
+                - text.count(close_char, checked_pos, split_pos)
+            )
+        checked_pos = split_pos
+        if depth == 0:
+            shards.append(text[start:split_pos])
+            start = split_pos
+            pos = start + shard_size
+        else:
+            pos = match.end()
+    shards.append(text[start:])
+    return shards
+
+
+class EntryIndexer(BibTeXEntryIterator):
+    """Find the positions of entries without parsing their fields.
+
+    All entries are skipped as unwanted. @string and @preamble commands and
+    errors outside of entry bodies are recorded in order.
+    """
+
+    def __init__(self, text, **kwargs):
+        super(EntryIndexer, self).__init__(text, **kwargs)
+        self.records = []
+        self.strings = []
+        self.command_starts = []
+
+    def handle_error(self, error):
+        self.records.append(('error', FormattedError.from_error(error)))
+
+    def want_entry(self, key):
+        lineno = self.base_lineno + self.count_newlines(self.command_start)
+        self.records.append(['entry', key, self.command_start, None, lineno, len(self.strings)])
+        return False
+
+    def parse_command(self):
+        self.command_starts.append(self.command_start)
+        return super(EntryIndexer, self).parse_command()
+
+    def parse_string_body(self, body_end):
+        super(EntryIndexer, self).parse_string_body(body_end)
+        self.strings.append((self.current_field_name, ''.join(self.current_value)))
+
+    def index(self):
+        """Return the records with entry end positions filled in.
+
+        An entry ends where the next command starts.
+        """
+        for command in self:
+            if command[0] == 'preamble':
+                self.records.append(('preamble', command[1][0]))
+        for record in self.records:
+            if record[0] == 'entry':
+                next_command = bisect_right(self.command_starts, record[2])
+                if next_command < len(self.command_starts):
+                    record[3] = self.command_starts[next_command]
+                else:
+                    record[3] = len(self.text)
+        return self.records
+
+
+class EntryIndex(object):
+    """Byte offsets of the entries in a .bib file.
+
+    The index is stored next to the .bib file. It is valid as long as the
+    size and the modification time of the file (or, failing that, its
+    content hash) and the parsing options stay the same.
+
+    Each entry record is (u'entry', key, start, end, lineno, string_count),
+    where string_count is the number of @string definitions preceding the
+    entry.
+    """
+
+    suffix = '.pybtex-index'
+
+    def __init__(self, options, records, strings, content_hash, size=None, mtime=None):
+        self.options = options
+        self.records = records
+        self.strings = strings
+        self.content_hash = content_hash
+        self.size = size
+        self.mtime = mtime
+
+    @classmethod
+    def build(cls, content, options, filename=None):
+        from pybtex.cache import get_content_hash
+
+        encoding, macros, resync_at_line_start = options
+        try:
+            text = content.decode(encoding)
+        except UnicodeDecodeError, e:
+            raise PybtexError(unicode(e), filename=filename)
+        indexer = EntryIndexer(
+            text,
+            macros=macros,
+            filename=filename,
+            resync_at_line_start=resync_at_line_start,
+        )
+        records = indexer.index()
+
+        # convert character positions to byte offsets
+        positions = sorted(set(record[pos] for record in records if record[0] == 'entry' for pos in (2, 3)))
+        if len(text) == len(content):
+            offsets = dict((pos, pos) for pos in positions)
+        else:
+            encoder = codecs.getincrementalencoder(encoding)()
+            offsets = {}
+            prev_pos = byte_pos = 0
+            for pos in positions:
+                byte_pos += len(encoder.encode(text[prev_pos:pos]))
+                offsets[pos] = byte_pos
+                prev_pos = pos
+        for record in records:
+            if record[0] == 'entry':
+                record[2] = offsets[record[2]]
+                record[3] = offsets[record[3]]
+        records = [tuple(record) for record in records]
+        return cls(options, records, indexer.strings, get_content_hash(content))
+
+    @classmethod
+    def get_index_filename(cls, filename):
+        return filename + cls.suffix
+
+    @classmethod
+    def load(cls, filename):
+        try:
+            with open(cls.get_index_filename(filename), 'rb') as index_file:
+                index_version, index = pickle.load(index_file)
+        except (EnvironmentError, pickle.UnpicklingError, EOFError, ValueError):
+            return None
+        if index_version != version:
+            return None
+        return index
+
+    def save(self, filename):
+        index_filename = self.get_index_filename(filename)
+        try:
+            fd, temp_filename = mkstemp(dir=os.path.dirname(os.path.abspath(index_filename)))
+            with os.fdopen(fd, 'wb') as index_file:
+                pickle.dump((version, self), index_file, pickle.HIGHEST_PROTOCOL)
+            os.chmod(temp_filename, S_IMODE(os.stat(filename).st_mode))
+            os.rename(temp_filename, index_filename)
+        except EnvironmentError:
+            pass
+
+    def set_stat(self, stat):
+        self.size = stat.st_size
+        self.mtime = stat.st_mtime
+
+    def is_up_to_date(self, options, stat):
+        return (
+            self.options == options
+            and self.size == stat.st_size
+            and self.mtime == stat.st_mtime
+        )
+
+
 class Parser(BaseParser):
     name = 'bibtex'
     suffixes = '.bib',
     unicode_io = True
 
     macros = None
+    max_interned_length = 40
 
     def __init__(self,
             encoding=None,
             macros=month_names,
             person_fields=Person.valid_roles,
             keyless_entries=False,
+            chunk_size=None,
+            shard_size=1024 * 1024,
+            index=False,
+            use_mmap=False,
+            resync_at_line_start=False,
+            raw_persons=False,
             **kwargs
         ):
+        """
+        If chunk_size is set, the input stream is read and parsed in chunks
+        of chunk_size characters instead of being read into memory at once.
+
+        When parsing files in parallel, files larger than shard_size
+        characters are split into several jobs.
+
+        If index is True and only some entries are wanted, parse_file()
+        parses just the wanted entries, finding them with an EntryIndex
+        stored next to the .bib file.
+
+        If use_mmap is True and the encoding is UTF-8 or ASCII, parse_file()
+        maps the file into memory and parses it without decoding it as a
+        whole (see BytesEntryIterator).
+
+        Entry types, field names and field values up to max_interned_length
+        characters long are interned, so that repeated values (journal
+        names, months, years) are stored only once.
+
+        If resync_at_line_start is True, parsing resumes at the next @ at
+        the beginning of a line after a syntax error (see BibTeXEntryIterator).
+
+        If raw_persons is True, person fields are not split into names and
+        are kept in entry.fields as raw strings. Entry.split_persons() turns
+        them into Person objects when they are needed.
+        """
         BaseParser.__init__(self, encoding, **kwargs)
 
         self.macros = dict(macros)
-        self.person_fields = person_fields
+        self.person_fields = () if raw_persons else person_fields
         self.keyless_entries = keyless_entries
+        self.chunk_size = chunk_size
+        self.shard_size = shard_size
+        self.index = index
+        self.use_mmap = use_mmap
+        self.resync_at_line_start = resync_at_line_start
+        self.interned_strings = {}
 
     def process_entry(self, entry_type, key, fields):
-        entry = Entry(entry_type)
-
-        if key is None:
-            key = 'unnamed-%i' % self.unnamed_entry_counter
-            self.unnamed_entry_counter += 1
+        self.add_entry(key, self.make_entry(entry_type, fields))
 
+    def make_entry(self, entry_type, fields):
+        intern = self.intern
+        entry_fields = {}
+        entry_persons = {}
         for field_name, field_value_list in fields:
-            field_value = textutils.normalize_whitespace(self.flatten_value_list(field_value_list))
+            field_name = intern(field_name)
+            if len(field_value_list) == 1:
+                field_value = textutils.normalize_whitespace(field_value_list[0])
+            else:
+                field_value = textutils.normalize_whitespace(self.flatten_value_list(field_value_list))
             if field_name in self.person_fields:
-                for name in split_name_list(field_value):
-                    entry.add_person(Person(name), field_name)
+                names = split_name_list(field_value)
+                if names:
+                    entry_persons.setdefault(field_name, []).extend(
+                        Person(name) for name in names
+                    )
             else:
-                entry.fields[field_name] = field_value
+                if len(field_value) <= self.max_interned_length:
+                    field_value = intern(field_value)
+                entry_fields[field_name] = field_value
+        return Entry(intern(entry_type), entry_fields, entry_persons)
+
+    def intern(self, string):
+        """Return a previously seen string equal to the given one, if any."""
+        return self.interned_strings.setdefault(string, string)
+
+    def add_entry(self, key, entry):
+        if key is None:
+            key = 'unnamed-%i' % self.unnamed_entry_counter
+            self.unnamed_entry_counter += 1
         self.data.add_entry(key, entry)
 
     def process_preamble(self, value_list):
@@ -343,18 +878,59 @@ class Parser(BaseParser):
         report_error(error)
 
     def parse_stream(self, stream):
-        self.unnamed_entry_counter = 1
-        text = stream.read()
+        if self.chunk_size:
+            text = u''
+        else:
+            text = stream.read()
+            stream = None
         self.command_start = 0
 
         entry_iterator = BibTeXEntryIterator(
             text,
+            stream=stream,
+            chunk_size=self.chunk_size,
             keyless_entries=self.keyless_entries,
+            resync_at_line_start=self.resync_at_line_start,
             handle_error=self.handle_error,
             want_entry=self.data.want_entry,
             filename=self.filename,
             macros=self.macros,
         )
+        return self.parse_entries(entry_iterator)
+
+    def parse_file_mmap(self, filename):
+        with pybtex.io.open_raw(filename) as f:
+            size = os.fstat(f.fileno()).st_size
+            if size:
+                content = mmap(f.fileno(), 0, access=ACCESS_READ)
+            else:
+                content = ''
+            # errors are formatted right away, as their context is read from
+            # the mapping, which is closed after parsing
+            entry_iterator = BytesEntryIterator(
+                content,
+                self.encoding,
+                keyless_entries=self.keyless_entries,
+                resync_at_line_start=self.resync_at_line_start,
+                handle_error=lambda error: self.handle_error(FormattedError.from_error(error)),
+                want_entry=self.data.want_entry,
+                filename=filename,
+                macros=self.macros,
+            )
+            try:
+                self.parse_entries(entry_iterator)
+            except UnicodeDecodeError, e:
+                raise PybtexError(unicode(e), filename=filename)
+            finally:
+                if size:
+                    content.close()
+
+    def parse_entries(self, entry_iterator):
+        self.unnamed_entry_counter = 1
+        self.process_commands(entry_iterator)
+        return self.data
+
+    def process_commands(self, entry_iterator):
         for entry in entry_iterator:
             entry_type = entry[0]
             if entry_type == 'string':
@@ -363,4 +939,258 @@ class Parser(BaseParser):
                 self.process_preamble(*entry[1])
             else:
                 self.process_entry(entry_type, *entry[1])
-        return self.data
+
+    def parse_file(self, filename, file_suffix=None):
+        if self.index and self.can_use_index():
+            if file_suffix is not None:
+                filename = filename + file_suffix
+            self.filename = filename
+            self.parse_file_indexed(filename)
+            return self.data
+        if self.use_mmap and not self.cache and self.can_use_mmap():
+            if file_suffix is not None:
+                filename = filename + file_suffix
+            self.filename = filename
+            self.parse_file_mmap(filename)
+            return self.data
+        return super(Parser, self).parse_file(filename, file_suffix)
+
+    def can_use_mmap(self):
+        return codecs.lookup(self.encoding).name in ('utf-8', 'ascii')
+
+    def can_use_index(self):
+        wanted_entries = self.data.wanted_entries
+        return (
+            wanted_entries is not None
+            and '*' not in wanted_entries
+            and not self.keyless_entries
+            and u'@'.encode(self.encoding) == '@'
+        )
+
+    def get_index(self, filename):
+        """Load the EntryIndex for the file, or build and save a new one."""
+        from pybtex.cache import get_content_hash
+
+        options = self.encoding, sorted(self.macros.iteritems()), self.resync_at_line_start
+        stat = os.stat(filename)
+        index = EntryIndex.load(filename)
+        if index and index.is_up_to_date(options, stat):
+            return index
+        with pybtex.io.open_raw(filename) as f:
+            content = f.read()
+        if not (index and index.options == options and index.content_hash == get_content_hash(content)):
+            index = EntryIndex.build(content, options, filename)
+        index.set_stat(stat)
+        index.save(filename)
+        return index
+
+    def parse_file_indexed(self, filename):
+        index = self.get_index(filename)
+        self.unnamed_entry_counter = 1
+        macros = dict(self.macros)
+        string_count = 0
+        with pybtex.io.open_raw(filename) as f:
+            content = mmap(f.fileno(), 0, access=ACCESS_READ) if index.size else ''
+            try:
+                for record in index.records:
+                    if record[0] == 'error':
+                        self.handle_error(record[1])
+                    elif record[0] == 'preamble':
+                        self.process_preamble(record[1])
+                    else:
+                        key, start, end, lineno, entry_string_count = record[1:]
+                        if not self.data.want_entry(key):
+                            continue
+                        for name, value in index.strings[string_count:entry_string_count]:
+                            macros[name] = value
+                        string_count = entry_string_count
+                        self.parse_indexed_entry(content[start:end], lineno, macros)
+            finally:
+                if index.size:
+                    content.close()
+
+    def parse_indexed_entry(self, content, lineno, macros):
+        try:
+            text = content.decode(self.encoding)
+        except UnicodeDecodeError, e:
+            raise PybtexError(unicode(e), filename=self.filename)
+        entry_iterator = BibTeXEntryIterator(
+            text,
+            handle_error=self.handle_error,
+            filename=self.filename,
+            macros=macros,
+            resync_at_line_start=self.resync_at_line_start,
+        )
+        entry_iterator.base_lineno = lineno
+        for entry in entry_iterator:
+            self.process_entry(entry[0], *entry[1])
+
+    def make_jobs(self, filename):
+        self.filename = filename
+        with pybtex.io.open_unicode(filename, encoding=self.encoding) as f:
+            try:
+                text = f.read()
+            except UnicodeDecodeError, e:
+                raise PybtexError(unicode(e), filename=filename)
+
+        jobs = []
+        start = 0
+        lineno = 1
+        redefined_macros = set()
+        for shard_text in split_bibliography(text, self.shard_size):
+            jobs.append(Shard(
+                filename, shard_text, start, lineno, frozenset(redefined_macros),
+                is_first=not jobs, is_last=start + len(shard_text) == len(text),
+            ))
+            start += len(shard_text)
+            lineno += shard_text.count('\n') + shard_text.count('\r')
+            redefined_macros.update(name.lower() for name in STRING_COMMAND.findall(shard_text))
+        return jobs
+
+    def get_cache_key(self, content_hash):
+        # unwanted entries are skipped by run_job()
+        wanted_entries = self.data.wanted_entries
+        if wanted_entries is not None and '*' not in wanted_entries:
+            wanted_entries = sorted(wanted_entries)
+        else:
+            wanted_entries = None
+        return super(Parser, self).get_cache_key(content_hash) + (
+            sorted(self.macros.iteritems()),
+            self.keyless_entries,
+            tuple(self.person_fields),
+            self.resync_at_line_start,
+            wanted_entries,
+        )
+
+    def make_cache_job(self, filename, content):
+        try:
+            text = content.decode(self.encoding)
+        except UnicodeDecodeError, e:
+            raise PybtexError(unicode(e), filename=filename)
+        return Shard(filename, text, 0, 1, frozenset(), is_first=True, is_last=True)
+
+    def run_job(self, shard):
+        entry_iterator = ShardEntryIterator(
+            shard,
+            keyless_entries=self.keyless_entries,
+            resync_at_line_start=self.resync_at_line_start,
+            want_entry=self.data.want_entry,
+            macros=self.macros,
+        )
+        records = entry_iterator.records
+        for command in entry_iterator:
+            entry_type = command[0]
+            if entry_type == 'string':
+                pass
+            elif entry_type == 'preamble':
+                records.append(('preamble', command[1][0]))
+            else:
+                key, fields = command[1]
+                entry = None
+                if not any(has_macros(value) for name, value in fields):
+                    entry = self.make_entry(entry_type, fields)
+                    fields = None
+                entry_errors = entry_iterator.pop_entry_errors()
+                records.append(('entry', entry_type, key, fields, entry, entry_errors))
+        return records
+
+    def make_worker(self):
+        worker = super(Parser, self).make_worker()
+        worker.data.wanted_entries = self.data.wanted_entries
+        return worker
+
+    def merge_job_result(self, shard, records):
+        self.filename = shard.filename
+        if shard.is_first:
+            self.unnamed_entry_counter = 1
+            self.file_macros = dict(self.macros)
+            self.parsed_sequentially = False
+        elif self.parsed_sequentially:
+            # already parsed by parse_rest_sequentially()
+            return
+        for record in records:
+            if record[0] == 'error':
+                self.handle_error(record[1])
+            elif record[0] == 'skipped':
+                key, start, end = record[1:]
+                # wanted because of cross-references from the preceding entries
+                if self.data.want_entry(key) and not self.parse_skipped_entry(shard, start, end):
+                    self.parse_rest_sequentially(shard, start)
+                    return
+            elif record[0] == 'sequential':
+                self.parse_rest_sequentially(shard, record[1])
+                return
+            elif record[0] == 'string':
+                name, value_list = record[1:]
+                self.file_macros[name] = self.flatten_value_list(self.substitute_macros(value_list))
+            elif record[0] == 'preamble':
+                self.process_preamble(self.substitute_macros(record[1]))
+            else:
+                entry_type, key, fields, entry, entry_errors = record[1:]
+                if key is not None and not self.data.want_entry(key):
+                    continue
+                for error in entry_errors:
+                    self.handle_error(error)
+                if entry is None:
+                    fields = [
+                        (name, self.substitute_macros(value_list))
+                        for name, value_list in fields
+                    ]
+                    entry = self.make_entry(entry_type, fields)
+                self.add_entry(key, entry)
+
+    def parse_skipped_entry(self, shard, start, end):
+        """Parse an entry skipped by ShardEntryIterator.
+
+        Return False if the entry is malformed. The sequential parser could
+        resume at a different position then.
+        """
+        entry_errors = []
+        entry_iterator = BibTeXEntryIterator(
+            shard.text[start:end],
+            handle_error=entry_errors.append,
+            filename=shard.filename,
+            macros=self.file_macros,
+        )
+        commands = list(entry_iterator)
+        if entry_errors or len(commands) != 1:
+            return False
+        entry_type, (key, fields) = commands[0]
+        self.process_entry(entry_type, key, fields)
+        return True
+
+    def parse_rest_sequentially(self, shard, start):
+        """Parse the file from the given position in the shard to the end,
+        as parse_stream() would.
+        """
+        if shard.is_last:
+            text = shard.text[start:]
+        else:
+            with pybtex.io.open_unicode(shard.filename, encoding=self.encoding) as f:
+                text = f.read()[shard.start + start:]
+        entry_iterator = BibTeXEntryIterator(
+            text,
+            keyless_entries=self.keyless_entries,
+            resync_at_line_start=self.resync_at_line_start,
+            handle_error=self.handle_error,
+            want_entry=self.data.want_entry,
+            filename=shard.filename,
+            macros=self.file_macros,
+        )
+        entry_iterator.base_lineno = (
+            shard.lineno + shard.text.count('\n', 0, start) + shard.text.count('\r', 0, start)
+        )
+        self.process_commands(entry_iterator)
+        self.parsed_sequentially = True
+
+    def substitute_macros(self, value_list):
+        """Substitute macro placeholders left by ShardEntryIterator."""
+        def substitute(part):
+            if not isinstance(part, Macro):
+                return part
+            try:
+                return self.file_macros[part.name.lower()]
+            except KeyError:
+                self.handle_error(part.error)
+                return ''
+        return [substitute(part) for part in value_list]
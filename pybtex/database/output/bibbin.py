@@ -0,0 +1,145 @@
+# Copyright (c) 2012  Andrey Golovizin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Compact binary bibliography format.
+
+The format is meant for loading large pre-processed databases as fast as
+possible. Every string is stored once in a string table, and everything
+else is an array of 32-bit integers referring to the strings by their
+index (their code). All integers are little-endian.
+
+The file consists of:
+
+- the header: MAGIC followed by unsigned integers (FORMAT_VERSION, the
+  number of strings, the size of the string data in bytes, the size of the
+  integer array, and the position of the key index in the integer array or
+  0 if there is no index);
+- the string table: the lengths of the UTF-8 encoded strings, followed by
+  the string data;
+- the integer array: the number of preamble strings and their codes, then
+  the number of entries and the entry records, then the key index.
+
+Each entry record is prefixed with its length, so that unwanted entries
+can be skipped without decoding:
+
+    length, key, type, number of fields, (name, value) ...,
+    number of roles, (role, number of persons, person ...) ...
+
+A person is either -1 followed by the code of an unparsed name string, or
+the numbers of the first, middle, prelast, last and lineage name parts,
+followed by the codes of the name parts.
+
+The key index lists (key, record position) pairs. It lets the parser find
+the wanted entries without reading the records of all other entries.
+"""
+
+import sys
+import struct
+from array import array
+
+from pybtex.database.output import BaseWriter
+
+
+MAGIC = 'PYBTEXDB'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<8s5I')
+UNPARSED_PERSON = -1
+
+
+def to_little_endian(integers):
+    if sys.byteorder != 'little':
+        integers.byteswap()
+    return integers
+
+
+class Writer(BaseWriter):
+    """Outputs the compact binary format"""
+
+    name = 'bibbin'
+    aliases = 'binary',
+    suffixes = '.bibbin',
+
+    def __init__(self, encoding=None, index=True):
+        super(Writer, self).__init__(encoding)
+        self.index = index
+
+    def write_stream(self, bib_data, stream):
+        strings = []
+        codes = {}
+
+        def get_code(string):
+            try:
+                return codes[string]
+            except KeyError:
+                code = codes[string] = len(strings)
+                strings.append(string)
+                return code
+
+        def write_person(person):
+            if person._string is not None:
+                integers.extend((UNPARSED_PERSON, get_code(person._string)))
+                return
+            parts = (
+                person._first, person._middle, person._prelast,
+                person._last, person._lineage,
+            )
+            integers.extend(len(part) for part in parts)
+            for part in parts:
+                integers.extend(get_code(name) for name in part)
+
+        def write_entry(key, entry):
+            start = len(integers)
+            integers.extend((0, get_code(key), get_code(entry.type), len(entry.fields)))
+            for name, value in entry.fields.iteritems():
+                integers.extend((get_code(name), get_code(value)))
+            integers.append(len(entry.persons))
+            for role, persons in entry.persons.iteritems():
+                integers.extend((get_code(role), len(persons)))
+                for person in persons:
+                    write_person(person)
+            integers[start] = len(integers) - start - 1
+
+        integers = array('i')
+        integers.append(len(bib_data._preamble))
+        integers.extend(get_code(value) for value in bib_data._preamble)
+        integers.append(len(bib_data.entries))
+        index = []
+        for key, entry in bib_data.entries.iteritems():
+            index.append((get_code(key), len(integers)))
+            write_entry(key, entry)
+        if self.index:
+            index_pos = len(integers)
+            integers.append(len(index))
+            for key_code, position in index:
+                integers.extend((key_code, position))
+        else:
+            index_pos = 0
+
+        string_data = [string.encode('UTF-8') for string in strings]
+        lengths = array('i', [len(data) for data in string_data])
+        string_data = ''.join(string_data)
+        stream.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, len(strings), len(string_data),
+            len(integers), index_pos,
+        ))
+        stream.write(to_little_endian(lengths).tostring())
+        stream.write(string_data)
+        stream.write(to_little_endian(integers).tostring())
@@ -29,6 +29,7 @@ from pybtex.textutils import capfirst, add_period
 strict = False
 error_code = 0
 stderr = pybtex.io.stderr
+report = None
 
 
 def enable_strict_mode(enable=True):
@@ -47,6 +48,66 @@ def capture():
         stderr = orig_stderr
 
 
+@contextmanager
+def collect():
+    """Collect reported errors into an ErrorReport instead of printing them.
+
+    >>> from pybtex.exceptions import PybtexError
+    >>> with collect() as report:
+    ...     report_error(PybtexError('something is wrong'))
+    ...     report_error(PybtexError('something else is wrong', filename='test.bib'))
+    >>> len(report)
+    2
+    >>> print report.format()
+    WARNING: Something is wrong.
+    test.bib: WARNING: Something else is wrong.
+    >>> print report.format(max_errors=1)
+    WARNING: Something is wrong.
+    ... and 1 more error(s).
+
+    """
+
+    global report
+    orig_report = report
+    report = ErrorReport()
+    try:
+        yield report
+    finally:
+        report = orig_report
+
+
+class ErrorReport(object):
+    """A batch of errors.
+
+    The errors are only formatted when the report is printed, so collecting
+    a large number of errors is cheap.
+    """
+
+    def __init__(self):
+        self.errors = []
+
+    def __len__(self):
+        return len(self.errors)
+
+    def __iter__(self):
+        return iter(self.errors)
+
+    def add(self, exception):
+        self.errors.append(exception)
+
+    def format(self, prefix='WARNING: ', max_errors=None):
+        errors = self.errors if max_errors is None else self.errors[:max_errors]
+        lines = [format_error(error, prefix) for error in errors]
+        num_omitted = len(self.errors) - len(errors)
+        if num_omitted:
+            lines.append(u'... and {0} more error(s).'.format(num_omitted))
+        return u'\n'.join(lines)
+
+    def print_report(self, prefix='WARNING: ', max_errors=None):
+        if self.errors:
+            print >>stderr, self.format(prefix, max_errors)
+
+
 def format_error(exception, prefix='ERROR: '):
     lines = []
     context = exception.get_context()
@@ -71,6 +132,9 @@ def report_error(exception):
 
     if strict:
         raise exception
+    elif report is not None:
+        report.add(exception)
+        error_code = 2
     else:
         print_error(exception, 'WARNING: ')
         error_code = 2
@@ -32,3 +32,29 @@ class PybtexError(Exception):
         """Return filename, if relevant."""
         return self.filename
 
+
+
+class FormattedError(PybtexError):
+    """A pre-formatted copy of another error.
+
+    Unlike the original error, it does not keep references to the parser and
+    can be pickled, e.g. to be passed between processes.
+    """
+
+    def __init__(self, message, filename=None, context=None):
+        super(FormattedError, self).__init__(message, filename=filename)
+        self.context = context
+
+    @classmethod
+    def from_error(cls, error):
+        return cls(
+            unicode(error),
+            filename=error.get_filename(),
+            context=error.get_context(),
+        )
+
+    def __unicode__(self):
+        return self.args[0]
+
+    def get_context(self):
+        return self.context
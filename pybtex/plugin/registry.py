@@ -3,16 +3,19 @@ plugin_registry = {
         "class_name": "Writer", 
         "suffixes": {
             ".xml": "bibtexml", 
+            ".bibbin": "bibbin", 
             ".bibtexml": "bibtexml", 
             ".bibyaml": "bibyaml", 
             ".bib": "bibtex", 
             ".yaml": "bibyaml"
         }, 
         "aliases": {
+            "binary": "bibbin", 
             "yaml": "bibyaml"
         }, 
         "default_plugin": "bibtex", 
         "plugins": [
+            "bibbin", 
             "bibtex", 
             "bibtexml", 
             "bibyaml"
@@ -61,16 +64,19 @@ plugin_registry = {
         "class_name": "Parser", 
         "suffixes": {
             ".xml": "bibtexml", 
+            ".bibbin": "bibbin", 
             ".bibtexml": "bibtexml", 
             ".bibyaml": "bibyaml", 
             ".bib": "bibtex", 
             ".yaml": "bibyaml"
         }, 
         "aliases": {
+            "binary": "bibbin", 
             "yaml": "bibyaml"
         }, 
         "default_plugin": "bibtex", 
         "plugins": [
+            "bibbin", 
             "bibtex", 
             "bibtexml", 
             "bibyaml"
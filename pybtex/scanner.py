@@ -23,6 +23,7 @@
 """
 
 import re
+from bisect import bisect_left
 
 from pybtex.exceptions import PybtexError
 
@@ -40,31 +41,158 @@ class Pattern(object):
     def __init__(self, regexp, description, flags=0):
         self.description = description
         compiled_regexp = re.compile(regexp, flags=flags)
+        self.regexp = compiled_regexp
         self.search = compiled_regexp.search
         self.match = compiled_regexp.match
         self.findall = compiled_regexp.findall
+        self.finditer = compiled_regexp.finditer
 
 
 class Literal(Pattern):
     def __init__(self, literal):
+        self.literal = literal
         pattern = re.compile(re.escape(literal))
         description = u"'{0}'".format(literal)
         super(Literal, self).__init__(pattern, description)
 
 
+class Alternation(object):
+    """Several single-character literal patterns compiled into a single regexp.
+
+    Each pattern gets its own named group, so the nearest token can be found
+    with a single search instead of searching for each pattern separately.
+    For single-character literals, the leftmost match is also the one that
+    ends first, so the result is the same as with separate searches. This
+    is not true for longer literals (with u'ab' and u'b', the leftmost
+    match of u'ab' ends at the same position as u'b'), so they are not
+    combined.
+
+    >>> lbrace, rbrace = Literal(u'{'), Literal(u'}')
+    >>> alternation = Alternation.get([lbrace, rbrace])
+    >>> alternation is Alternation.get([lbrace, rbrace])
+    True
+    >>> end, pattern = alternation.find(u'abc}{', 0)
+    >>> end, pattern is rbrace
+    (4, True)
+    >>> alternation.find(u'abc', 0)
+    (None, None)
+    >>> print Alternation.get([Pattern(u'[a-z]+', 'word')])
+    None
+    >>> print Alternation.get([Literal(u'ab'), Literal(u'b')])
+    None
+
+    """
+
+    cache = {}
+
+    def __init__(self, patterns):
+        assert all(self.is_single_char(pattern) for pattern in patterns)
+        self.patterns = {}
+        group_regexps = []
+        for i, pattern in enumerate(patterns):
+            group_name = 'p{0}'.format(i)
+            self.patterns[group_name] = pattern
+            group_regexps.append(u'(?P<{0}>{1})'.format(group_name, pattern.regexp.pattern))
+        self.search = re.compile(u'|'.join(group_regexps)).search
+
+    @classmethod
+    def get(cls, patterns):
+        """Return a (cached) Alternation for the patterns.
+
+        Return None if the patterns cannot be combined.
+        """
+        key = tuple(patterns)
+        try:
+            return cls.cache[key]
+        except KeyError:
+            if all(cls.is_single_char(pattern) for pattern in patterns):
+                alternation = cls(patterns)
+            else:
+                alternation = None
+            cls.cache[key] = alternation
+            return alternation
+
+    @staticmethod
+    def is_single_char(pattern):
+        return isinstance(pattern, Literal) and len(pattern.literal) == 1
+
+    def find(self, text, pos):
+        """Return the end position and the pattern of the nearest token."""
+        match = self.search(text, pos)
+        if match:
+            return match.end(), self.patterns[match.lastgroup]
+        else:
+            return None, None
+
+
 class Scanner(object):
     text = None
-    lineno = 1
     pos = 0
+    offset = 0
+    base_lineno = 1
+    newline_index = None
+    indexed_pos = 0
+    stream = None
+    chunk_size = 64 * 1024
     WHITESPACE = Pattern(ur'\s+', 'whitespace')
     NEWLINE = Pattern(ur'[\r\n]', 'newline')
 
-    def __init__(self, text, filename=None):
+    def __init__(self, text, filename=None, stream=None, chunk_size=None):
+        """Create a scanner for the given text.
+
+        If a stream is given, it is read in chunks of chunk_size characters
+        and appended to text as needed. Text that has already been consumed
+        is dropped from the buffer (see discard_pos()), so the buffer does
+        not grow with the size of the input.
+        """
         self.text = text
         self.end_pos = len(text)
         self.filename = filename
+        self.stream = stream
+        if chunk_size:
+            self.chunk_size = chunk_size
 
-    def skip_to(self, patterns):
+    def discard_pos(self):
+        """Return the buffer position before which the text may be dropped.
+
+        The current line is kept for error messages.
+        """
+        return self.line_start(self.pos)
+
+    def line_start(self, pos):
+        """Return the buffer position of the line containing pos."""
+        return max(self.text.rfind('\n', 0, pos), self.text.rfind('\r', 0, pos)) + 1
+
+    def read_more(self):
+        """Read the next chunk from the input stream into the buffer.
+
+        Return False if there is no more input.
+        """
+        if self.stream is None:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.stream = None
+            return False
+        discard_pos = self.discard_pos()
+        num_discarded_newlines = self.count_newlines(discard_pos)
+        self.base_lineno += num_discarded_newlines
+        self.newline_index = [
+            newline_pos - discard_pos
+            for newline_pos in self.newline_index[num_discarded_newlines:]
+        ]
+        self.indexed_pos -= discard_pos
+        self.text = self.text[discard_pos:] + chunk
+        self.offset += discard_pos
+        self.pos -= discard_pos
+        self.end_pos = len(self.text)
+        return True
+
+    def find_nearest(self, patterns):
+        """Return the end position and the pattern of the nearest token."""
+        alternation = Alternation.get(patterns)
+        if alternation:
+            return alternation.find(self.text, self.pos)
         end = None
         winning_pattern = None
         for pattern in patterns:
@@ -72,25 +200,50 @@ class Scanner(object):
             if match and (not end or match.end() < end):
                 end = match.end()
                 winning_pattern = pattern
+        return end, winning_pattern
+
+    def skip_to(self, patterns):
+        while True:
+            end, winning_pattern = self.find_nearest(patterns)
+            if winning_pattern and end < self.end_pos or not self.read_more():
+                break
         if winning_pattern:
             value = self.text[self.pos : end]
             self.pos = end
             #print '>>', value
-            self.update_lineno(value)
             return Token(value, winning_pattern)
 
-    def update_lineno(self, value):
-        num_newlines = len(self.NEWLINE.findall(value))
-        self.lineno += num_newlines
+    @property
+    def lineno(self):
+        return self.base_lineno + self.count_newlines(self.pos)
+
+    def count_newlines(self, pos):
+        """Return the number of newline characters in the buffer before pos.
+
+        Line numbers are only needed for error messages, so newline
+        positions are not tracked while scanning. Instead, they are indexed
+        lazily up to the requested position and looked up with bisect.
+        """
+        if self.newline_index is None:
+            self.newline_index = []
+        if pos > self.indexed_pos:
+            self.newline_index.extend(
+                match.start() for match in
+                self.NEWLINE.finditer(self.text, self.indexed_pos, pos)
+            )
+            self.indexed_pos = pos
+        return bisect_left(self.newline_index, pos)
 
     def eat_whitespace(self):
-        whitespace = self.WHITESPACE.match(self.text, self.pos)
-        if whitespace:
-            self.pos = whitespace.end()
-            self.update_lineno(whitespace.group())
+        while True:
+            whitespace = self.WHITESPACE.match(self.text, self.pos)
+            if whitespace:
+                self.pos = whitespace.end()
+            if self.pos < self.end_pos or not self.read_more():
+                break
 
     def eof(self):
-        return self.pos == self.end_pos
+        return self.pos == self.end_pos and not self.read_more()
 
     def get_token(self, patterns, allow_eof=False):
         self.eat_whitespace()
@@ -101,6 +254,8 @@ class Scanner(object):
                 raise PrematureEOF(self)
         for pattern in patterns:
             match = pattern.match(self.text, self.pos)
+            while match and match.end() == self.end_pos and self.read_more():
+                match = pattern.match(self.text, self.pos)
             if match:
                 value = match.group()
                 self.pos = match.end()
@@ -120,20 +275,18 @@ class Scanner(object):
             return token
 
     def get_error_context_info(self):
-        return self.lineno, self.pos
+        # the context line is extracted right away, as the text may be
+        # dropped from the stream buffer later
+        while True:
+            eol = self.NEWLINE.search(self.text, self.pos)
+            if eol or not self.read_more():
+                break
+        line_start = self.line_start(self.pos)
+        line_end = eol.start() if eol else self.end_pos
+        return self.text[line_start:line_end], self.lineno, self.pos - line_start
 
     def get_error_context(self, context_info):
-        error_lineno, error_pos  = context_info
-        if error_lineno is not None:
-            error_lineno0 = error_lineno - 1
-            lines = self.text.splitlines(True)
-            before_error = ''.join(lines[:error_lineno0])
-            colno = error_pos - len(before_error)
-            context = lines[error_lineno0].rstrip('\r\n')
-        else:
-            colno = None
-            context = None
-        return context, error_lineno, colno
+        return context_info
 
 
 class PybtexSyntaxError(PybtexError):
@@ -162,6 +315,30 @@ class PrematureEOF(PybtexSyntaxError):
 
 
 class TokenRequired(PybtexSyntaxError):
+    r"""
+    The context is the line of the error, even if the text before it was
+    dropped from the stream buffer:
+
+    >>> from StringIO import StringIO
+    >>> stream = StringIO(u'one\ntwo\nthree four')
+    >>> scanner = Scanner(u'', stream=stream, chunk_size=3)
+    >>> word = Pattern(ur'\w+', 'word')
+    >>> for i in range(3):
+    ...     print scanner.required([word]).value
+    one
+    two
+    three
+    >>> try:
+    ...     scanner.required([Literal(u'!')])
+    ... except TokenRequired, error:
+    ...     print unicode(error)
+    ...     print error.get_context()
+    Syntax error in line 3: '!' expected
+    three four
+         ^^^
+
+    """
+
     def __init__(self, description, parser):
         message = u'{0} expected'.format(description)
         super(TokenRequired, self).__init__(message, parser)
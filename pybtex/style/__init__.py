@@ -19,6 +19,8 @@
 # TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
+from copy import copy
+
 
 class FormattedEntry(object):
     """Formatted bibliography entry. Consists of
@@ -43,3 +45,135 @@ class FormattedBibliography(object):
     def get_longest_label(self):
         label_style = self.style.label_style
         return label_style.get_longest_label(self.entries)
+
+
+class IncrementalBibliography(object):
+    """A bibliography that is kept up to date with the bibliography data.
+
+    When entries are added, replaced or removed, only the changed entries
+    and the entries cross-referencing them are formatted again. Sorting
+    keys and labels are cached in the same way. Entries whose labels
+    change (for example, when an alpha label gets a new suffix) get the
+    new label without being formatted again.
+
+    >>> from pybtex.database import BibliographyData, Entry, Person
+    >>> from pybtex.plugin import find_plugin
+    >>> from pybtex.backends.plaintext import Backend
+    >>> style = find_plugin('pybtex.style.formatting', 'alpha')()
+    >>> data = BibliographyData([
+    ...     ('knuth', Entry('book',
+    ...         {'title': 'The TeXbook', 'publisher': 'Addison-Wesley', 'year': '1984'},
+    ...         persons={'author': [Person('Knuth, Donald E.')]},
+    ...     )),
+    ... ])
+    >>> bibliography = IncrementalBibliography(style, data, ['*'])
+    >>> for entry in bibliography.update():
+    ...     print entry.label, entry.text.render(Backend())
+    Knu84 Donald E. Knuth. The TeXbook. Addison-Wesley, 1984.
+    >>> data.add_entry('knuth2', Entry('book',
+    ...     {'title': 'The METAFONTbook', 'publisher': 'Addison-Wesley', 'year': '1986'},
+    ...     persons={'author': [Person('Knuth, Donald E.')]},
+    ... ))
+    >>> sorted(bibliography.dirty)
+    ['knuth2']
+    >>> for entry in bibliography.update():
+    ...     print entry.label, entry.text.render(Backend())
+    Knu84 Donald E. Knuth. The TeXbook. Addison-Wesley, 1984.
+    Knu86 Donald E. Knuth. The METAFONTbook. Addison-Wesley, 1986.
+    >>> data.replace_entry('knuth2', Entry('book',
+    ...     {'title': 'The METAFONTbook', 'publisher': 'Addison-Wesley', 'year': '1984'},
+    ...     persons={'author': [Person('Knuth, Donald E.')]},
+    ... ))
+    >>> for entry in bibliography.update():
+    ...     print entry.label, entry.text.render(Backend())
+    Knu84a Donald E. Knuth. The METAFONTbook. Addison-Wesley, 1984.
+    Knu84b Donald E. Knuth. The TeXbook. Addison-Wesley, 1984.
+
+    The style itself is not changed. With unsorted styles, the entries stay
+    in the same order as in the updated data:
+
+    >>> 'format_label' in vars(style.label_style)
+    False
+    >>> unsrt = find_plugin('pybtex.style.formatting', 'unsrt')()
+    >>> bibliography = IncrementalBibliography(unsrt, data, ['*'])
+    >>> [entry.key for entry in bibliography.update()]
+    ['knuth', 'knuth2']
+    >>> data.update(BibliographyData([
+    ...     ('knuth', Entry('book',
+    ...         {'title': 'The TeXbook', 'publisher': 'Addison-Wesley', 'year': '1984'},
+    ...         persons={'author': [Person('Knuth, Donald E.')]},
+    ...     )),
+    ...     ('lamport', Entry('book',
+    ...         {'title': 'LaTeX', 'publisher': 'Addison-Wesley', 'year': '1986'},
+    ...         persons={'author': [Person('Lamport, Leslie')]},
+    ...     )),
+    ...     ('knuth2', Entry('book',
+    ...         {'title': 'The METAFONTbook', 'publisher': 'Addison-Wesley', 'year': '1984'},
+    ...         persons={'author': [Person('Knuth, Donald E.')]},
+    ...     )),
+    ... ]))
+    >>> [entry.key for entry in bibliography.update()]
+    ['knuth', 'lamport', 'knuth2']
+
+    """
+
+    def __init__(self, style, bib_data, citations, min_crossrefs=2):
+        self.style = style
+        self.bib_data = bib_data
+        self.citations = citations
+        self.min_crossrefs = min_crossrefs
+        self.dirty = set()
+        self.formatted_entries = {}
+        self.sorting_keys = {}
+        self.labels = {}
+        self.sorting_style = self.cache_plugin_method(style.sorting_style, 'sorting_key', self.sorting_keys)
+        self.label_style = self.cache_plugin_method(style.label_style, 'format_label', self.labels)
+        bib_data.listeners.append(self.entry_changed)
+
+    def cache_plugin_method(self, plugin, name, cache):
+        """Return a copy of the plugin caching an entry method by entry key.
+
+        The plugin itself is left unchanged.
+        """
+        method = getattr(plugin, name, None)
+        if method is None:
+            return plugin
+        def cached_method(entry):
+            key = entry.key.lower()
+            try:
+                return cache[key]
+            except KeyError:
+                result = cache[key] = method(entry)
+                return result
+        plugin = copy(plugin)
+        setattr(plugin, name, cached_method)
+        return plugin
+
+    def entry_changed(self, action, key):
+        self.dirty.add(key.lower())
+        for child_key in self.bib_data.get_crossref_children(key):
+            self.dirty.add(child_key.lower())
+
+    def update(self):
+        """Format the changed entries and return a FormattedBibliography."""
+        for key in self.dirty:
+            self.formatted_entries.pop(key, None)
+            self.sorting_keys.pop(key, None)
+            self.labels.pop(key, None)
+        self.dirty.clear()
+
+        style = self.style
+        citations = self.bib_data.add_extra_citations(self.citations, self.min_crossrefs)
+        sorted_entries = self.sorting_style.sort([self.bib_data.entries[key] for key in citations])
+        labels = self.label_style.format_labels(sorted_entries)
+        formatted_entries = []
+        for label, entry in zip(labels, sorted_entries):
+            key = entry.key.lower()
+            formatted_entry = self.formatted_entries.get(key)
+            if formatted_entry is None:
+                formatted_entry = style.format_entry(label, entry)
+            elif formatted_entry.label != label:
+                formatted_entry = FormattedEntry(entry.key, formatted_entry.text, label)
+            self.formatted_entries[key] = formatted_entry
+            formatted_entries.append(formatted_entry)
+        return FormattedBibliography(formatted_entries, style)
@@ -57,7 +57,7 @@ class LabelStyle(BaseLabelStyle):
                 yield label
             else:
                 yield label + chr(ord('a') + counted[label])
-                counted.update([label])
+                counted[label] += 1
 
     # note: this currently closely follows the alpha.bst code
     # we should eventually refactor it
@@ -0,0 +1,220 @@
+# Copyright (c) 2012  Andrey Golovizin
+#
+# Permission is hereby granted, free of charge, to any person obtaining
+# a copy of this software and associated documentation files (the
+# "Software"), to deal in the Software without restriction, including
+# without limitation the rights to use, copy, modify, merge, publish,
+# distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so, subject to
+# the following conditions:
+#
+# The above copyright notice and this permission notice shall be
+# included in all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND,
+# EXPRESS OR IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF
+# MERCHANTABILITY, FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT.
+# IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY
+# CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION OF CONTRACT,
+# TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""Microbenchmarks for performance-critical parts of Pybtex.
+
+Usage: python -m pybtex.tests.benchmarks [benchmark name ...]
+"""
+
+import sys
+from time import time
+
+
+benchmarks = []
+
+
+def benchmark(f):
+    benchmarks.append(f)
+    return f
+
+
+def report(name, stmt, number, **namespace):
+    """Run stmt number times in the given namespace and print the best time."""
+    best = min(measure(stmt, number, namespace) for i in range(3))
+    print '    {0:<48} {1:8.3f} us'.format(name, best / number * 1e6)
+
+
+def measure(stmt, number, namespace):
+    code = compile('for _ in _range:\n    ' + stmt, '<benchmark>', 'exec')
+    namespace = dict(namespace, _range=xrange(number))
+    start = time()
+    exec code in namespace
+    return time() - start
+
+
+@benchmark
+def case_insensitive_dict():
+    from pybtex.utils import (
+        CaseInsensitiveDict, OrderedCaseInsensitiveDict,
+        CaseInsensitiveDefaultDict, CaseInsensitiveSet,
+    )
+    keys = ['Entry{0}'.format(i) for i in range(1000)]
+    items = [(key, i) for i, key in enumerate(keys)]
+    # a plain dict with lowercase keys is the baseline
+    lowercase_items = [(key.lower(), value) for key, value in items]
+    for cls in dict, CaseInsensitiveDict, OrderedCaseInsensitiveDict:
+        d = cls(lowercase_items if cls is dict else items)
+        name = cls.__name__
+        report(name + ' __getitem__', 'd["entry500"]', 100000, d=d)
+        report(name + ' __contains__', '"entry500" in d', 100000, d=d)
+        report(name + ' get', 'd.get("entry500")', 100000, d=d)
+        report(name + ' __setitem__', 'd["entry500"] = 1', 100000, d=d)
+        report(name + ' __delitem__ + __setitem__', 'del d["entry500"]; d["entry500"] = 1', 100000, d=d)
+        report(name + ' iteritems', 'list(d.iteritems())', 1000, d=d)
+        report(name + ' construction', 'cls(items)', 100, cls=cls, items=items)
+    d = CaseInsensitiveDefaultDict(int)
+    report('CaseInsensitiveDefaultDict += 1', 'd["Entry500"] += 1', 100000, d=d)
+    s = CaseInsensitiveSet(keys)
+    report('CaseInsensitiveSet __contains__', '"entry500" in s', 100000, s=s)
+
+
+@benchmark
+def memoize():
+    from pybtex.utils import memoize, LRUCache
+
+    def plain_memoize(f):
+        # memoize() before the caches were bounded, for comparison
+        memory = {}
+        def new_f(*args):
+            try:
+                return memory[args]
+            except KeyError:
+                result = memory[args] = f(*args)
+                return result
+        return new_f
+
+    def format_name(names, n, format):
+        return names
+    args = u'Knuth, Donald E. and Lamport, Leslie', 2, u'{ff~}{vv~}{ll}{, jj}'
+    for name, f in [
+        ('plain dict memoize', plain_memoize(format_name)),
+        ('memoize', memoize(format_name)),
+    ]:
+        f(*args)
+        report(name + ' hit', 'f(*args)', 1000000, f=f, args=args)
+    f = memoize(max_size=1000)(format_name)
+    many_args = [(str(i), 2, u'{ll}') for i in range(10000)]
+    report('memoize miss with eviction', 'for a in many_args: f(*a)', 10, f=f, many_args=many_args)
+    cache = LRUCache(max_size=1000)
+    cache['key'] = 'value'
+    report('LRUCache __getitem__', 'cache["key"]', 100000, cache=cache)
+
+
+@benchmark
+def bibtex_builtins():
+    from pybtex.bibtex.interpreter import (
+        Interpreter, Function, Integer, String, Identifier, QuotedVar,
+    )
+    from pybtex.database import Entry
+    interpreter = Interpreter(None, None)
+    interpreter.current_entry_key = 'knuth1984'
+    interpreter.current_entry = Entry('book', {'title': u'The {TeX}book'})
+    interpreter.command_integers([Identifier('x')])
+    vars = interpreter.vars
+    skip = vars['skip$']
+    names = u'Donald E. Knuth and Leslie Lamport'
+    arguments = [
+        ('>', [2, 1]),
+        ('<', [2, 1]),
+        ('=', [u'abc', u'abc']),
+        ('+', [2, 1]),
+        ('-', [2, 1]),
+        ('*', [u'abc', u'def']),
+        (':=', [1, vars['x']]),
+        ('add.period$', [u'The TeXbook']),
+        ('change.case$', [u'The TeXbook', u't']),
+        ('change.case$', [u'The {TeX}book', u't']),
+        ('chr.to.int$', [u'a']),
+        ('cite$', []),
+        ('duplicate$', [u'abc']),
+        ('empty$', [u'abc']),
+        ('format.name$', [names, 2, u'{ff~}{vv~}{ll}{, jj}']),
+        ('if$', [1, skip, skip]),
+        ('int.to.chr$', [97]),
+        ('int.to.str$', [1984]),
+        ('missing$', [u'abc']),
+        ('num.names$', [names]),
+        ('pop$', [u'abc']),
+        ('purify$', [u'The TeXbook']),
+        ('purify$', [u'The {TeX}book']),
+        ('quote$', []),
+        ('skip$', []),
+        ('substring$', [u'The {TeX}book', 5, 3]),
+        ('swap$', [u'abc', u'def']),
+        ('text.length$', [u'The TeXbook']),
+        ('text.length$', [u'The {TeX}book']),
+        ('text.prefix$', [u'The TeXbook', 5]),
+        ('text.prefix$', [u'The {TeX}book', 5]),
+        ('type$', []),
+        ('width$', [u'The TeXbook']),
+        ('width$', [u'The {TeX}book']),
+    ]
+    # extending and clearing the stack is included in every measurement
+    namespace = dict(
+        i=interpreter, extend=interpreter.stack.extend, stack=interpreter.stack,
+    )
+    report('(stack setup)', 'extend(args); del stack[:]', 100000, args=[], **namespace)
+    for name, args in arguments:
+        # the string functions in pybtex.bibtex.utils are memoized, so the
+        # repeated calls measure cache hits; strings with braces miss the
+        # fast paths on the first call only
+        if any(isinstance(arg, basestring) and '{' in arg for arg in args):
+            label = name + ' (braces)'
+        else:
+            label = name
+        report(label, 'extend(args); f.execute(i); del stack[:]', 100000,
+            f=vars[name], args=args, **namespace)
+
+    body = [
+        Integer(2), Integer(1), Identifier('>'),
+        String('abc'), Identifier('duplicate$'), Identifier('='), Identifier('+'),
+        QuotedVar('x'), Identifier(':='),
+    ]
+    report('interpreted function', 'f.execute(i)', 100000, f=Function(body), i=interpreter)
+    compiled_function = interpreter.compiler.compile_function(body)
+    report('compiled function', 'f.execute(i)', 100000, f=compiled_function, i=interpreter)
+
+
+@benchmark
+def incremental_bibliography():
+    from pybtex.database import BibliographyData, Entry, Person
+    from pybtex.plugin import find_plugin
+    from pybtex.style import IncrementalBibliography
+
+    def make_entry(i):
+        return Entry('book',
+            {'title': 'Book {0}'.format(i), 'publisher': 'Publisher', 'year': str(1900 + i % 100)},
+            persons={'author': [Person('Author{0}, A.'.format(i % 300))]},
+        )
+    data = BibliographyData(('entry{0}'.format(i), make_entry(i)) for i in range(1000))
+    style = find_plugin('pybtex.style.formatting', 'alpha')()
+    citations = list(data.entries)
+    report('full format', 'list(style.format_entries(entries))', 1,
+        style=style, entries=data.entries.values())
+    bibliography = IncrementalBibliography(style, data, citations)
+    bibliography.update()
+    report('update after one edit', 'replace_entry("entry500", entry); bibliography.update()', 20,
+        replace_entry=data.replace_entry, entry=make_entry(501), bibliography=bibliography)
+    report('update after one removal and addition',
+        'remove_entry("entry500"); add_entry("entry500", entry); bibliography.update()', 20,
+        remove_entry=data.remove_entry, add_entry=data.add_entry, entry=make_entry(500),
+        bibliography=bibliography)
+
+
+def main(names):
+    for f in benchmarks:
+        if not names or f.__name__ in names:
+            print f.__name__
+            f()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,6 +1,7 @@
 import os
 import pkgutil
 import posixpath
+import re
 from contextlib import contextmanager
 from shutil import rmtree
 from tempfile import mkdtemp
@@ -9,6 +10,7 @@ from tempfile import mkdtemp
 from pybtex import io
 from pybtex import errors
 from pybtex import bibtex
+from pybtex.cache import FileCache
 from pybtex.tests import diff
 
 
@@ -63,3 +65,164 @@ def test_bibtex_engine():
         ('cyrillic', 'unsrt'),
     ]:
         yield check_make_bibliography, bib_name, bst_name
+
+
+def make_bibliography(bib_name, bst_name, **kwargs):
+    with cd_tempdir():
+        copy_files(bib_name, bst_name)
+        write_aux('test.aux', bib_name, bst_name)
+        with errors.capture():
+            bibtex.make_bibliography('test.aux', **kwargs)
+        with io.open_unicode('test.bbl', 'r') as result_file:
+            return result_file.read()
+
+
+def check_compiled_functions(bib_name, bst_name):
+    interpreted_result = make_bibliography(bib_name, bst_name, compile_functions=False)
+    compiled_result = make_bibliography(bib_name, bst_name, compile_functions=True)
+    assert compiled_result == interpreted_result, diff(interpreted_result, compiled_result)
+
+
+def test_compiled_functions():
+    for bst_name in 'plain', 'unsrt', 'apacite', 'jurabib':
+        yield check_compiled_functions, 'xampl', bst_name
+
+
+def test_parse_cache():
+    cache_dir = mkdtemp(prefix='pybtex_test_')
+    try:
+        cache = FileCache(cache_dir)
+        correct_result = make_bibliography('xampl', 'plain')
+        for i in range(2):
+            result = make_bibliography('xampl', 'plain', parse_cache=cache)
+            assert result == correct_result, diff(correct_result, result)
+        # parsed .bib file, parsed .bst file, and compiled code
+        assert len(os.listdir(cache_dir)) == 3
+    finally:
+        rmtree(cache_dir)
+
+
+def check_parallel_iterate(bib_name, bst_name):
+    from pybtex.bibtex.interpreter import Interpreter
+    correct_result = make_bibliography(bib_name, bst_name)
+    min_parallel_citations = Interpreter.min_parallel_citations
+    Interpreter.min_parallel_citations = 0
+    try:
+        result = make_bibliography(bib_name, bst_name, processes=2)
+    finally:
+        Interpreter.min_parallel_citations = min_parallel_citations
+    assert result == correct_result, diff(correct_result, result)
+
+
+def test_parallel_iterate():
+    for bst_name in 'plain', 'apacite', 'jurabib':
+        yield check_parallel_iterate, 'xampl', bst_name
+
+
+def test_parallel_iterate_globals():
+    from pybtex.bibtex.interpreter import Interpreter
+    # only the entries in the first chunk assign last.title
+    bst = u'''
+        ENTRY { title } {} {}
+        STRINGS { last.title }
+        FUNCTION {remember.title}
+        { title empty$ 'skip$ { title 'last.title := } if$ }
+        FUNCTION {output} { last.title write$ newline$ }
+        READ
+        ITERATE {remember.title}
+        EXECUTE {output}
+    '''
+    bib = u'''
+        @book{one, title = "One"}
+        @book{two, title = "Two"}
+        @book{three}
+        @book{four}
+    '''
+
+    def make_bibliography(**kwargs):
+        with cd_tempdir():
+            with io.open_unicode('test.bst', 'w') as bst_file:
+                bst_file.write(bst)
+            with io.open_unicode('test.bib', 'w') as bib_file:
+                bib_file.write(bib)
+            write_aux('test.aux', 'test', 'test')
+            with errors.capture():
+                bibtex.make_bibliography('test.aux', **kwargs)
+            with io.open_unicode('test.bbl', 'r') as result_file:
+                return result_file.read()
+
+    min_parallel_citations = Interpreter.min_parallel_citations
+    Interpreter.min_parallel_citations = 0
+    try:
+        result = make_bibliography(processes=2)
+    finally:
+        Interpreter.min_parallel_citations = min_parallel_citations
+    assert make_bibliography() == u'Two\n'
+    assert result == u'Two\n', result
+
+
+def check_empty_stack(compile_functions, body):
+    from pybtex.bibtex.interpreter import Interpreter, Identifier
+    from pybtex.bibtex.exceptions import BibTeXError
+    interpreter = Interpreter(None, None, compile_functions=compile_functions)
+    interpreter.command_function([Identifier('test')], body)
+    try:
+        interpreter.vars['test'].execute(interpreter)
+    except BibTeXError, error:
+        assert str(error) == 'pop from empty stack', error
+    else:
+        assert False, 'BibTeXError not raised'
+
+
+def test_empty_stack():
+    from pybtex.bibtex.interpreter import Integer, Identifier
+    for body in (
+        [Identifier('pop$')],
+        [Integer(1), Identifier('>')],
+        [Integer(1), Identifier('substring$')],
+        [Identifier('duplicate$')],
+    ):
+        for compile_functions in False, True:
+            yield check_empty_stack, compile_functions, body
+
+
+def check_other_index_error(compile_functions):
+    from pybtex.bibtex.interpreter import Interpreter, Identifier, String
+    interpreter = Interpreter(None, None, compile_functions=compile_functions)
+    # add.period$ pops its only argument, then fails with IndexError on '}'
+    interpreter.command_function([Identifier('test')], [
+        String('}'), Identifier('add.period$'),
+    ])
+    try:
+        interpreter.vars['test'].execute(interpreter)
+    except IndexError, error:
+        assert str(error) == 'string index out of range', error
+    else:
+        assert False, 'IndexError not raised'
+
+
+def test_other_index_error():
+    for compile_functions in False, True:
+        yield check_other_index_error, compile_functions
+
+
+def test_syntax_errors():
+    bib = u"""@book{broken, title = {Broken} note = x @book{inline, title = {Inline}}
+@book{good, title = {Good}}
+"""
+
+    def check(resync_at_line_start, keys):
+        with cd_tempdir():
+            copy_resource('pybtex.tests.data', 'plain.bst')
+            with io.open_unicode('test.bib', 'w') as bib_file:
+                bib_file.write(bib)
+            write_aux('test.aux', 'test', 'plain')
+            with errors.capture() as stderr:
+                bibtex.make_bibliography('test.aux', resync_at_line_start=resync_at_line_start)
+            with io.open_unicode('test.bbl', 'r') as result_file:
+                result = result_file.read()
+        assert re.findall(r'\\bibitem\{(\w+)\}', result) == keys, result
+        assert stderr.getvalue().count("Syntax error in line 1: '}' expected") == 1, stderr.getvalue()
+
+    check(False, ['broken', 'good', 'inline'])
+    check(True, ['broken', 'good'])
@@ -30,9 +30,17 @@ https://github.com/matthew-brett/babybib
 """
 
 
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
+
 from pybtex.database import BibliographyData
 from pybtex.database import Entry, Person
-from pybtex.database.input.bibtex import Parser
+from pybtex.database.input.bibtex import Parser, EntryIndex
+from pybtex.cache import FileCache
+from pybtex.exceptions import PybtexError
+from pybtex import io
+from pybtex import errors
 from io import StringIO
 from itertools import izip_longest
 
@@ -48,15 +56,60 @@ class TestParser(Parser):
         self.errors.append(error)
 
 
-class ParserTest(object):
+class TempDirTest(object):
+    """Create a temporary directory for .bib files for each test."""
+
+    def setUp(self):
+        super(TempDirTest, self).setUp()
+        self.tempdir = mkdtemp(prefix='pybtex_test_')
+        self.addCleanup(rmtree, self.tempdir)
+
+    def write_bib_file(self, input, name='test.bib'):
+        filename = os.path.join(self.tempdir, name)
+        with io.open_unicode(filename, 'w', encoding='UTF-8') as bib_file:
+            bib_file.write(input)
+        return filename
+
+
+class ParserTest(TempDirTest):
     input = None
     correct_result = None
     parser_options = {}
     errors = []
 
     def test_parser(self):
-        parser = TestParser(encoding='UTF-8', **self.parser_options)
-        parser.parse_stream(StringIO(self.input))
+        self.check_parser()
+
+    def test_streaming_parser(self):
+        for chunk_size in 1, 2, 7, 100:
+            self.check_parser(chunk_size=chunk_size)
+
+    def test_parallel_parser(self):
+        # without indentation, every entry starts a new shard
+        unindented_input = u'\n'.join(line.lstrip() for line in self.input.splitlines())
+        for input in self.input, unindented_input:
+            filename = self.write_bib_file(input)
+            self.check_parser(processes=2, shard_size=1, filenames=[filename])
+
+    def test_indexed_parser(self):
+        filename = self.write_bib_file(self.input)
+        options = {'index': True}
+        if 'wanted_entries' not in self.parser_options:
+            options['wanted_entries'] = list(self.correct_result.entries.keys())
+        for i in range(2):
+            self.check_parser(filenames=[filename], **options)
+
+    def test_mmap_parser(self):
+        filename = self.write_bib_file(self.input)
+        self.check_parser(use_mmap=True, filenames=[filename])
+
+    def check_parser(self, filenames=None, **extra_options):
+        parser_options = dict(self.parser_options, **extra_options)
+        parser = TestParser(encoding='UTF-8', **parser_options)
+        if filenames:
+            parser.parse_files(filenames)
+        else:
+            parser.parse_stream(StringIO(self.input))
         result = parser.data
         correct_result = self.correct_result
         assert result == correct_result
@@ -147,6 +200,25 @@ class AtTest(ParserTest, TestCase):
         "Syntax error in line 2: '(' or '{' expected",
     ]
 
+class ResyncTest(ParserTest, TestCase):
+    parser_options = {'resync_at_line_start': True}
+    input = u"""
+        @Article{broken, title = "Broken" author = "Nobody" @Article{inline,}
+        @Article{good, title = {Good}}
+        Stray @ sign
+        @Article{good2,}
+    """
+    correct_result = BibliographyData({
+        'broken': Entry('article', {'title': 'Broken'}),
+        'good': Entry('article', {'title': 'Good'}),
+        'good2': Entry('article'),
+    })
+    errors = [
+        "Syntax error in line 2: '}' expected",
+        "Syntax error in line 5: '(' or '{' expected",
+    ]
+
+
 class EntryTypesTest(ParserTest, TestCase):
     input = u"""
         Testing what are allowed for entry types
@@ -371,6 +443,135 @@ class WantedEntriesTest(ParserTest, TestCase):
     })
 
 
+class SkippedEntriesTest(ParserTest, TestCase):
+    parser_options = {'wanted_entries': ['wanted1', 'wanted2', 'wanted3']}
+    input = u"""
+        @String{word = "first"}
+        @Article{unwanted1, title = {An @Article{wanted1, title = {Wrong}}}}
+        @Article{wanted1, title = word}
+        @Article(unwanted2, title = "Not (really) an @Article(wanted2,)" # {{{{)}}}})
+        @String{word = "second"}
+        @Article{unwanted3, title = {{{{Deeply} nested}}} # "@Article{wanted2}"}
+        @Article{wanted2, title = word}
+        @Article{unwanted4, title = {Unterminated}
+        @Article{wanted3}
+    """
+    correct_result = BibliographyData(entries={
+        'wanted1': Entry('article', {'title': 'first'}),
+        'wanted2': Entry('article', {'title': 'second'}),
+        'wanted3': Entry('article'),
+    })
+
+
+class MalformedUnwantedEntryTest(TempDirTest, TestCase):
+    """Parallel and cached parsing must skip unwanted entries as the
+    sequential parser does, and resume at the same positions.
+    """
+
+    input = u"""
+@Preamble{"pre"}
+@Book{h, title = "H"}
+@Misc{d, title = "D", crossref = "x"}
+@Misc{e, crossref = "x"}
+@Book{x, title = "X"}
+@Book{c, title = "broken
+@Book{A, title = "A"}
+@Preamble{"pre"}
+@Book{y, title = "Y"}
+@Book{w, title = "broken too
+@Book{b, title = "unterminated
+@Book{z, title = "Z"}
+"""
+    wanted_entries = ['h', 'A', 'd', 'e', 'y', 'w', 'z']
+
+    def setUp(self):
+        super(MalformedUnwantedEntryTest, self).setUp()
+        self.filename = self.write_bib_file(self.input)
+
+    def parse(self, **options):
+        parser = TestParser(wanted_entries=self.wanted_entries, **options)
+        parser.parse_files([self.filename])
+        return parser
+
+    def check_result(self, parser, correct_parser):
+        self.assertEqual(parser.data, correct_parser.data)
+        self.assertEqual(parser.data.entries.keys(), correct_parser.data.entries.keys())
+        self.assertEqual(parser.data.preamble(), correct_parser.data.preamble())
+        self.assertEqual(
+            [unicode(error) for error in parser.errors],
+            [unicode(error) for error in correct_parser.errors],
+        )
+
+    def test_parallel_parser(self):
+        correct_parser = self.parse()
+        self.assertEqual(correct_parser.data.entries.keys(), ['h', 'd', 'e', 'x', 'A', 'y', 'w'])
+        self.assertEqual(correct_parser.data.preamble(), 'prepre')
+        for shard_size in 1, 30, 1000:
+            self.check_result(self.parse(processes=2, shard_size=shard_size), correct_parser)
+
+    def test_parse_cache(self):
+        correct_parser = self.parse()
+        cache = FileCache(os.path.join(self.tempdir, 'cache'))
+        # a cached result for all entries must not be used for wanted entries
+        TestParser(cache=cache).parse_files([self.filename])
+        for i in range(2):
+            self.check_result(self.parse(cache=cache), correct_parser)
+
+
+class InterningTest(TestCase):
+    input = u"""
+        @String{pr = "Phys. Rev."}
+        @Article{one, journal = pr, year = 1997, month = jan}
+        @Article{two, journal = pr, year = "1997", month = jan}
+        @Article{three, Journal = "Phys." # " Rev.", year = {1997}, month = jan}
+    """
+
+    def test_interning(self):
+        parser = TestParser()
+        entries = parser.parse_stream(StringIO(self.input)).entries.values()
+        for field_name in 'journal', 'year', 'month':
+            values = [entry.fields[field_name] for entry in entries]
+            self.assertEqual(len(set(id(value) for value in values)), 1)
+        field_names = [name for entry in entries for name in entry.fields.keys()]
+        self.assertEqual(len(set(id(name) for name in field_names)), 3)
+
+
+class PersonTest(TestCase):
+    input = u"""
+        @Article{one, author = "Knuth, Donald E. and {Lamport}, Leslie", title = "Title"}
+    """
+
+    def test_lazy_persons(self):
+        parser = TestParser()
+        entry = parser.parse_stream(StringIO(self.input)).entries['one']
+        authors = entry.persons['author']
+        self.assertEqual(authors[1]._string, u'{Lamport}, Leslie')
+        self.assertEqual(authors[1].last(), [u'{Lamport}'])
+        self.assertEqual(authors[1]._string, None)
+        self.assertEqual(authors, [Person(u'Knuth, Donald E.'), Person(u'{Lamport}, Leslie')])
+
+    def test_invalid_name(self):
+        # reported while parsing, not on the first access
+        parser = TestParser()
+        input = u'@Article{one, author = "Knuth, Donald E. and a, b, c, d"}'
+        self.assertRaises(PybtexError, parser.parse_stream, StringIO(input))
+
+    def test_invalid_lazy_name(self):
+        person = Person(u'a')
+        person._string = u'a, b, c, d'
+        for i in range(2):
+            self.assertRaises(PybtexError, person.last)
+        self.assertEqual(person._string, u'a, b, c, d')
+
+    def test_raw_persons(self):
+        parser = TestParser(raw_persons=True)
+        entry = parser.parse_stream(StringIO(self.input)).entries['one']
+        self.assertEqual(entry.persons, {})
+        self.assertEqual(entry.fields['author'], u'Knuth, Donald E. and {Lamport}, Leslie')
+        entry.split_persons()
+        self.assertEqual(entry.persons, {'author': [Person(u'Knuth, Donald E.'), Person(u'{Lamport}, Leslie')]})
+
+
 class CrossrefTest(ParserTest, TestCase):
     parser_options = {'wanted_entries': ['GSL', 'GSL2']}
     input = u"""
@@ -394,3 +595,112 @@ class UnusedEntryTest(ParserTest, TestCase):
         )
     """
     correct_result = BibliographyData()
+
+
+class FileInputTest(TempDirTest, TestCase):
+    input = u"""
+@String{name = "Gal\xe1ssi, M\xe4rk"}
+@Article{gough, author = "Gough, Bri\xe1n"}
+@Article{galassi, author = name, title = undefined}
+@String{name = "G\xf6ugh"}
+@Article{G\xf6ugh2, author = name}
+@Article{d\xfcrer, title = "D\xfcrer" author = "D\xfcrer"}
+"""
+
+    def setUp(self):
+        super(FileInputTest, self).setUp()
+        self.filename = self.write_bib_file(self.input)
+
+    def parse(self, **options):
+        parser = TestParser(encoding='UTF-8', wanted_entries=['galassi', u'g\xf6ugh2', u'd\xfcrer'], **options)
+        parser.parse_file(self.filename)
+        return parser
+
+    def test_index(self):
+        correct_parser = self.parse()
+        self.assertEqual([unicode(error) for error in correct_parser.errors], [
+            'Undefined string in line 4: undefined',
+            "Syntax error in line 7: '}' expected",
+        ])
+        for i in range(2):
+            parser = self.parse(index=True)
+            self.assertEqual(parser.data, correct_parser.data)
+            self.assertEqual(
+                [unicode(error) for error in parser.errors],
+                [unicode(error) for error in correct_parser.errors],
+            )
+        assert os.path.exists(self.filename + EntryIndex.suffix)
+
+    def test_mmap(self):
+        correct_parser = self.parse()
+        parser = self.parse(use_mmap=True)
+        self.assertEqual(parser.data, correct_parser.data)
+        self.assertEqual(list(parser.data.entries.keys()), ['galassi', u'G\xf6ugh2', u'd\xfcrer'])
+        self.assertEqual(
+            [(unicode(error), error.get_context()) for error in parser.errors],
+            [(unicode(error), error.get_context()) for error in correct_parser.errors],
+        )
+
+    def test_outdated_index(self):
+        self.parse(index=True)
+        self.write_bib_file(self.input.replace(u'Gal\xe1ssi', u'Galassi'))
+        parser = self.parse(index=True)
+        self.assertEqual(parser.data, self.parse().data)
+        self.assertEqual(unicode(parser.data.entries['galassi'].persons['author'][0]), u'Galassi, M\xe4rk')
+
+
+class ParallelParserTest(TempDirTest, TestCase):
+    inputs = [
+        u"""
+@String{and = { and }}
+@Article(gsl, author = "Gough, Brian" # and # "Galassi, Mark")
+@String{and = { und }}
+@Article{xref1, crossref = "Journal"}
+@Article{xref2, crossref = "journal", author = nobody}
+""",
+        u"""
+@Article{gsl2, title = "Gough" # and # "Galassi"}
+@Journal{journal, year = 2001}
+@Article{gsl, title = "Duplicate"}
+""",
+    ]
+    correct_result = BibliographyData({
+        'gsl': Entry('article', persons={u'author': [Person(u'Gough, Brian'), Person(u'Galassi, Mark')]}),
+        'xref1': Entry('article', {'crossref': 'Journal'}),
+        'xref2': Entry('article', {'crossref': 'journal'}),
+        'gsl2': Entry('article', {'title': 'GoughGalassi'}),
+        'journal': Entry('journal', {'year': '2001'}),
+    })
+    errors = [
+        'Undefined string in line 6: nobody',
+        'Undefined string in line 2: and',
+    ]
+
+    def setUp(self):
+        super(ParallelParserTest, self).setUp()
+        self.filenames = [
+            self.write_bib_file(input, 'test{0}.bib'.format(i))
+            for i, input in enumerate(self.inputs)
+        ]
+
+    def test_parallel_parser(self):
+        for options in {}, {'processes': 3, 'shard_size': 1}:
+            parser = TestParser(wanted_entries=['gsl', 'xref1', 'xref2', 'gsl2'], **options)
+            with errors.capture() as stderr:
+                parser.parse_files(self.filenames)
+            self.assertEqual(parser.data, self.correct_result)
+            self.assertEqual(list(parser.data.entries.keys()), ['gsl', 'xref1', 'xref2', 'gsl2', 'journal'])
+            self.assertEqual([unicode(error) for error in parser.errors], self.errors)
+            self.assertEqual(stderr.getvalue(), 'WARNING: Repeated bibliograhpy entry: gsl.\n')
+
+    def test_parse_cache(self):
+        cache = FileCache(os.path.join(self.tempdir, 'cache'))
+        for wanted_entries in None, ['gsl', 'xref1', 'xref2', 'gsl2'], None:
+            parser = TestParser(wanted_entries=wanted_entries, cache=cache)
+            with errors.capture() as stderr:
+                parser.parse_files(self.filenames)
+            self.assertEqual(parser.data, self.correct_result)
+            self.assertEqual([unicode(error) for error in parser.errors], self.errors)
+            self.assertEqual(stderr.getvalue(), 'WARNING: Repeated bibliograhpy entry: gsl.\n')
+        # the results depend on the wanted entries
+        self.assertEqual(len(os.listdir(cache.directory)), 2 * len(self.filenames))
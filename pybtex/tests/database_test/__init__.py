@@ -61,6 +61,27 @@ class DatabaseIOTest(TestCase):
         self.reference_data._preamble = []
         self._test_input('bibtexml')
 
+    def test_bibbin_input(self):
+        self._test_input('bibbin')
+
+    def test_bibbin_wanted_entries(self):
+        from pybtex.database import BibliographyData, Entry
+        data = BibliographyData([
+            ('first', Entry('article', {'crossref': 'Proceedings'})),
+            ('second', Entry('article', {'crossref': 'proceedings'})),
+            ('unwanted', Entry('article', {'crossref': 'book'})),
+            ('proceedings', Entry('proceedings', {'crossref': 'book'})),
+            ('book', Entry('book', {'title': 'Book'})),
+        ])
+        for index in True, False:
+            stream = BytesIO()
+            writer = find_plugin('pybtex.database.output', 'bibbin')(index=index)
+            writer.write_stream(data, stream)
+            stream.seek(0)
+            parser = find_plugin('pybtex.database.input', 'bibbin')(wanted_entries=['FIRST', 'second'])
+            loaded_data = parser.parse_stream(stream)
+            self.assertEqual(loaded_data.entries.keys(), ['first', 'second', 'proceedings'])
+
     def test_repr(self):
         from pybtex.utils import OrderedCaseInsensitiveDict
         from pybtex.database import BibliographyData
@@ -73,3 +94,101 @@ class DatabaseIOTest(TestCase):
             'Person': Person,
         })
         self.assertEqual(data, self.reference_data)
+
+    def test_columnar(self):
+        from pybtex.database.columnar import ColumnarBibliographyData
+        columnar_data = ColumnarBibliographyData(self.reference_data.entries, self.reference_data._preamble)
+        self.assertEqual(len(columnar_data), len(self.reference_data.entries))
+        self.assertEqual(columnar_data.preamble(), self.reference_data.preamble())
+        self.assertEqual(columnar_data.to_bibliography_data(), self.reference_data)
+        self.assertEqual(
+            columnar_data.filter(language=u'english').keys,
+            [key for key, entry in self.reference_data.entries.iteritems()
+            if entry.fields.get('language') == u'english'],
+        )
+        # numbers match their string representation
+        self.assertEqual(
+            columnar_data.filter(year=1997).keys,
+            columnar_data.filter(year=u'1997').keys,
+        )
+        self.assertEqual(
+            columnar_data.filter(year=[1997, u'2006']).keys,
+            columnar_data.filter(year=[u'1997', u'2006']).keys,
+        )
+        self.assertTrue(columnar_data.filter(year=1997).keys)
+
+
+class CrossrefTest(TestCase):
+    def setUp(self):
+        from pybtex.database import BibliographyData, Entry, Person
+        self.data = BibliographyData([
+            ('article', Entry('article', {'crossref': 'proceedings', 'title': 'Title'})),
+            ('proceedings', Entry('proceedings',
+                {'crossref': 'Series', 'year': '1997'},
+                persons={'editor': [Person('Knuth, Donald E.')]},
+            )),
+            ('series', Entry('book', {'publisher': 'Springer', 'crossref': 'article'})),
+            ('book', Entry('book', {'crossref': 'missing'})),
+        ])
+        self.entries = self.data.entries
+
+    def test_inherited_fields(self):
+        from pybtex import errors
+        with errors.collect() as report:
+            article = self.entries['article']
+            self.assertEqual(article.fields['year'], '1997')
+            self.assertEqual(article.fields['editor'], 'Knuth, Donald E.')
+            self.assertEqual(article.fields['publisher'], 'Springer')
+            self.assertRaises(KeyError, lambda: article.fields['journal'])
+            self.assertRaises(KeyError, lambda: self.entries['book'].fields['year'])
+        self.assertEqual(len(report), 1)
+        self.assertTrue('cyclic cross-reference' in report.format().lower())
+
+    def test_cycle_reported_once_per_rebuild(self):
+        from pybtex import errors
+        with errors.collect() as report:
+            for key in self.entries:
+                self.data.get_crossref_chain(key)
+            self.assertEqual(len(report), 1)
+            self.entries['article'].fields['note'] = 'Note'
+            for key in self.entries:
+                self.data.get_crossref_chain(key)
+            self.assertEqual(len(report), 2)
+
+    def test_invalidation(self):
+        from pybtex.database import Entry, Person
+        from pybtex import errors
+        with errors.collect():
+            article = self.entries['article']
+            book = self.entries['book']
+            self.assertRaises(KeyError, lambda: article.fields['journal'])
+            self.assertRaises(KeyError, lambda: book.fields['year'])
+            self.entries['series'].fields['journal'] = 'Lecture Notes'
+            self.assertEqual(article.fields['journal'], 'Lecture Notes')
+            self.data.add_entry('missing', Entry('misc', {'year': '2000'}))
+            self.assertEqual(book.fields['year'], '2000')
+            self.entries['proceedings'].add_person(Person('Lamport, Leslie'), 'editor')
+            self.assertEqual(article.fields['editor'], 'Knuth, Donald E. and Lamport, Leslie')
+            del self.entries['proceedings'].fields['year']
+            self.assertRaises(KeyError, lambda: article.fields['year'])
+
+    def test_persons_invalidation(self):
+        from pybtex.database import Person
+        from pybtex import errors
+        with errors.collect():
+            article = self.entries['article']
+            proceedings = self.entries['proceedings']
+            self.assertEqual(article.fields['editor'], 'Knuth, Donald E.')
+            proceedings.persons['editor'] = [Person('Lamport, Leslie')]
+            self.assertEqual(article.fields['editor'], 'Lamport, Leslie')
+            self.assertEqual(proceedings.fields['editor'], 'Lamport, Leslie')
+            article.persons['editor'] = [Person('Patashnik, Oren')]
+            self.assertEqual(article.fields['editor'], 'Patashnik, Oren')
+            del article.persons['editor']
+            self.assertEqual(article.fields['editor'], 'Lamport, Leslie')
+            proceedings.persons.clear()
+            self.assertRaises(KeyError, lambda: article.fields['editor'])
+            proceedings.persons.setdefault('editor', [])
+            proceedings.persons['editor'].append(Person('Knuth, Donald E.'))
+            proceedings.fields.invalidate()
+            self.assertEqual(article.fields['editor'], 'Knuth, Donald E.')
@@ -142,3 +142,46 @@ def parse_name_test():
         person = Person(name)
         result = (person.bibtex_first(), person.prelast(), person.last(), person.lineage())
         assert result == correct_result
+
+
+def name_cache_test():
+    from io import StringIO
+    from pybtex.bibtex.names import format
+    from pybtex.database.input.bibtex import Parser
+    from pybtex.plugin import find_plugin
+
+    bib_data = u"""
+        @Book{knuth, author = "Knuth, Donald E. and Lamport, Leslie",
+            title = "Title", publisher = "Publisher", year = 1984}
+        @Book{lamport, author = "Lamport, Leslie",
+            title = "Title", publisher = "Publisher", year = 1986}
+    """
+    names = [u'Knuth, Donald E.', u'Lamport, Leslie']
+    style = find_plugin('pybtex.style.formatting')()
+
+    def format_bibliography():
+        entries = Parser().parse_stream(StringIO(bib_data)).entries
+        formatted_entries = list(style.format_entries(entries.values()))
+        formatted_names = [format(name, '{ll}') for name in names]
+        return [entry.text.plaintext() for entry in formatted_entries], formatted_names
+
+    parsed_names = []
+    def parse_string(self, name):
+        parsed_names.append(name)
+        return original_parse_string(self, name)
+    original_parse_string = Person.parse_string.im_func
+
+    Person.name_cache.clear()
+    Person.parse_string = parse_string
+    try:
+        correct_result = format_bibliography()
+        assert sorted(parsed_names) == names
+        del parsed_names[:]
+        hits = Person.name_cache.info().hits
+        result = format_bibliography()
+    finally:
+        Person.parse_string = original_parse_string
+    # persons of the new BibliographyData and the BibTeX format() use the cache
+    assert parsed_names == []
+    assert Person.name_cache.info().hits - hits == 5
+    assert result == correct_result
@@ -24,6 +24,7 @@ import re
 terminators = '.?!'
 dash_re = re.compile(r'-')
 whitespace_re = re.compile(r'\s+')
+irregular_whitespace_re = re.compile(r'\s\s|[^\S ]')
 
 def capfirst(s):
     return s[0].upper() + s[1:] if s else s
@@ -84,6 +85,12 @@ def normalize_whitespace(string):
     Abc def.
     >>> print normalize_whitespace('   \nAbc\r\ndef.')
     Abc def.
+    >>> string = u'Abc def.'
+    >>> normalize_whitespace(string) is string
+    True
     """
 
-    return whitespace_re.sub(' ', string.strip())
+    string = string.strip()
+    if not irregular_whitespace_re.search(string):
+        return string
+    return whitespace_re.sub(' ', string)
@@ -23,21 +23,212 @@
 """Miscellaneous small utils."""
 
 
-from functools import wraps
-from collections import Sequence, MutableMapping
-from types import GeneratorType
-
+import copy
+import itertools
+from functools import wraps, partial
+from collections import Mapping, MutableMapping, namedtuple
+from weakref import WeakSet
+
+
+CacheInfo = namedtuple('CacheInfo', 'hits misses evictions max_size size')
+
+all_caches = WeakSet()
+
+
+def get_cache_info():
+    """Return a dict mapping cache names to CacheInfo tuples."""
+    return dict((cache.name, cache.info()) for cache in all_caches)
+
+
+def clear_caches():
+    """Clear all memoized functions and other LRU caches."""
+    for cache in all_caches:
+        cache.clear()
+
+
+def memoize(f=None, max_size=10000):
+    """Cache the results of a function with hashable arguments.
+
+    Only about max_size recently used results are kept (see LRUCache). The
+    cache can be inspected and cleared with cache_info() and cache_clear()
+    methods of the function. Only calls and misses are counted, so that a
+    hit costs little more than a dict lookup.
+
+    >>> @memoize(max_size=2)
+    ... def square(x):
+    ...     print 'computing', x
+    ...     return x * x
+    >>> square(2), square(3), square(2)
+    computing 2
+    computing 3
+    (4, 9, 4)
+    >>> square(4)
+    computing 4
+    16
+    >>> square(3)
+    computing 3
+    9
+    >>> square.cache_info()
+    CacheInfo(hits=1, misses=4, evictions=2, max_size=2, size=2)
+    >>> square.cache_clear()
+    >>> square.cache_info()
+    CacheInfo(hits=0, misses=0, evictions=0, max_size=2, size=0)
+    >>> [square(5) for i in range(3)]
+    computing 5
+    [25, 25, 25]
+    >>> square.cache_info()
+    CacheInfo(hits=2, misses=1, evictions=0, max_size=2, size=1)
+    """
 
-def memoize(f):
-    memory = {}
+    if f is None:
+        return partial(memoize, max_size=max_size)
+    cache = LRUCache(max_size, name='{0}.{1}'.format(f.__module__, f.__name__), count_calls=True)
+    recent = cache.recent
+    count_call = cache.calls.next
     @wraps(f)
     def new_f(*args):
-        if args not in memory:
-            memory[args] = f(*args)
-        return memory[args]
+        count_call()
+        try:
+            return recent[args]
+        except KeyError:
+            pass
+        try:
+            return cache[args]
+        except KeyError:
+            result = cache[args] = f(*args)
+            return result
+    new_f.cache = cache
+    new_f.cache_info = cache.info
+    new_f.cache_clear = cache.clear
     return new_f
 
 
+class LRUCache(object):
+    """A dict-like cache that keeps about max_size recently used items.
+
+    Items are kept in two plain dicts (generations) of up to max_size / 2
+    items. New items go to the recent generation. When it is full, the old
+    generation is dropped and the recent one becomes old. Items found in
+    the old generation are moved back to the recent one. So a hit is a
+    single dict lookup, unlike with strict LRU order.
+
+    >>> cache = LRUCache(max_size=2)
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache['a']
+    1
+    >>> cache['c'] = 3
+    >>> 'a' in cache, 'b' in cache, 'c' in cache
+    (True, False, True)
+    >>> len(cache)
+    2
+    >>> cache['b']
+    Traceback (most recent call last):
+        ...
+    KeyError: 'b'
+    >>> cache.info()
+    CacheInfo(hits=1, misses=1, evictions=1, max_size=2, size=2)
+
+    All caches are registered in all_caches, see get_cache_info() and
+    clear_caches().
+    """
+
+    def __init__(self, max_size, name=None, count_calls=False):
+        """
+        If count_calls is True, the user of the cache calls next(self.calls)
+        on every lookup, and info() reports hits as calls minus misses. This
+        is used by memoize(), which looks items up in the recent generation
+        directly.
+        """
+        self.max_size = max_size
+        self.generation_size = max(max_size // 2, 1)
+        self.name = name or 'cache-{0}'.format(id(self))
+        self.calls = itertools.count() if count_calls else None
+        self.cleared_calls = 0
+        # the recent dict is never replaced, so that it may be bound once
+        self.recent = {}
+        self.old = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        all_caches.add(self)
+
+    def __len__(self):
+        return len(self.recent) + len(self.old)
+
+    def __contains__(self, key):
+        return key in self.recent or key in self.old
+
+    def __getitem__(self, key):
+        try:
+            value = self.recent[key]
+        except KeyError:
+            try:
+                value = self.old.pop(key)
+            except KeyError:
+                self.misses += 1
+                raise
+            self[key] = value
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        recent = self.recent
+        if key not in recent:
+            self.old.pop(key, None)
+            if len(recent) >= self.generation_size:
+                self.evictions += len(self.old)
+                self.old = recent.copy()
+                recent.clear()
+        recent[key] = value
+
+    def get_call_count(self):
+        # peek at the counter without advancing it
+        return next(copy.copy(self.calls))
+
+    def info(self):
+        if self.calls is None:
+            hits = self.hits
+        else:
+            hits = self.get_call_count() - self.cleared_calls - self.misses
+        return CacheInfo(hits, self.misses, self.evictions, self.max_size, len(self))
+
+    def clear(self):
+        """Remove all items and reset the statistics."""
+        self.recent.clear()
+        self.old = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.calls is not None:
+            self.cleared_calls = self.get_call_count()
+
+
+class SlotsPickleMixin(object):
+    """Make a class with __slots__ picklable with any pickle protocol.
+
+    Without __getstate__, such classes can only be pickled with protocol 2.
+    """
+
+    __slots__ = ()
+
+    def __getstate__(self):
+        # object.__getattribute__ does not fall back to __getattr__,
+        # so lazily computed slots are left unset
+        state = {}
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                try:
+                    state[name] = object.__getattribute__(self, name)
+                except AttributeError:
+                    pass
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            setattr(self, name, value)
+
+
 class CaseInsensitiveDict(MutableMapping):
     """A dict with case-insensitive lookup.
 
@@ -96,51 +287,68 @@ class CaseInsensitiveDict(MutableMapping):
 
     """
 
+    # items are stored in a single dict as lowercase key -> (key, value),
+    # and the methods inherited from MutableMapping are overridden
+    # with faster ones working with this dict directly
+
     def __init__(self, *args, **kwargs):
-        self._dict = dict(*args, **kwargs)
-        self._keys = dict((key.lower(), key) for key in self)
+        d = self._dict = {}
+        for key, value in dict(*args, **kwargs).iteritems():
+            d[key.lower()] = key, value
 
     def __len__(self):
         return len(self._dict)
 
     def __iter__(self):
-        return iter(self._dict)
+        return (key for key, value in self._dict.itervalues())
 
     def __setitem__(self, key, value):
         """To implement lowercase keys."""
-        key_lower = key.lower()
-        try:
-            existing_key = self._keys[key_lower]
-        except KeyError:
-            pass
-        else:
-            del self._dict[existing_key]
-        self._dict[key] = value
-        self._keys[key_lower] = key
+        self._dict[key.lower()] = key, value
 
     def __getitem__(self, key):
-        existing_key = self._keys[key.lower()]
-        return self._dict[existing_key]
+        return self._dict[key.lower()][1]
 
     def __delitem__(self, key):
-        key_lower = key.lower()
-        existing_key = self._keys[key_lower]
-        del self._dict[existing_key]
-        del self._keys[key_lower]
+        del self._dict[key.lower()]
 
     def __deepcopy__(self, memo):
         from copy import deepcopy
-        return CaseInsensitiveDict(
+        return type(self)(
             (key, deepcopy(value, memo)) for key, value in self.iteritems()
         )
 
     def __contains__(self, key):
-        return key.lower() in self._keys
+        return key.lower() in self._dict
+
+    def get(self, key, default=None):
+        try:
+            return self._dict[key.lower()][1]
+        except KeyError:
+            return default
+
+    def iterkeys(self):
+        return iter(self)
+
+    def keys(self):
+        return [key for key, value in self._dict.itervalues()]
+
+    def itervalues(self):
+        return (value for key, value in self._dict.itervalues())
+
+    def values(self):
+        return [value for key, value in self._dict.itervalues()]
+
+    def iteritems(self):
+        return self._dict.itervalues()
+
+    def items(self):
+        return self._dict.values()
 
     def __repr__(self):
         """A caselessDict version of __repr__ """
         return '{0}({1})'.format(
-            type(self).__name__, self._dict.__repr__()
+            type(self).__name__, repr(dict(self.iteritems()))
         )
 
 
@@ -169,10 +377,16 @@ class CaseInsensitiveDefaultDict(CaseInsensitiveDict):
 
     def __getitem__(self, key):
         try:
-            return super(CaseInsensitiveDefaultDict, self).__getitem__(key)
+            return self._dict[key.lower()][1]
         except KeyError:
             return self.default_factory()
 
+    def __deepcopy__(self, memo):
+        from copy import deepcopy
+        result = type(self)(self.default_factory)
+        result._dict = deepcopy(self._dict, memo)
+        return result
+
 
 class OrderedCaseInsensitiveDict(CaseInsensitiveDict):
     """ An (incomplete) ordered case-insensitive dict.
@@ -203,54 +417,98 @@ class OrderedCaseInsensitiveDict(CaseInsensitiveDict):
     True
     >>> list(d.iteritems()) == d.items()
     True
+    >>> del d['DOS']
+    >>> d.keys()
+    ['uno', 'tres', 'cuatro']
+    >>> d['dos'] = 2
+    >>> d.keys()
+    ['uno', 'tres', 'cuatro', 'dos']
+    >>> d['UNO'] = 'one'
+    >>> d.items()
+    [('uno', 'one'), ('tres', 3), ('cuatro', 4), ('dos', 2)]
+    >>> OrderedCaseInsensitiveDict([('uno', 1), ('UNO', 'one')]).items()
+    [('uno', 'one')]
 
     """
 
     def __init__(self, data=()):
-        if isinstance(data, GeneratorType):
-            data = list(data)
-        if isinstance(data, Sequence):
-            self.order = [key for key, value in data]
-        else:
-            self.order = data.keys()
-        super(OrderedCaseInsensitiveDict, self).__init__(data)
+        if isinstance(data, Mapping):
+            data = data.iteritems()
+        d = self._dict = {}
+        # lowercase keys in the order of insertion
+        order = self._order = []
+        # for constant time deletion, deleted keys are replaced with None
+        # and removed from self._order later by _compact(), and the positions
+        # of the keys in self._order are indexed by the first deletion
+        self._positions = None
+        self._holes = 0
+        for key, value in data:
+            key_lower = key.lower()
+            item = d.get(key_lower)
+            if item is None:
+                order.append(key_lower)
+            else:
+                key = item[0]
+            d[key_lower] = key, value
 
     def __setitem__(self, key, value):
-        if key not in self:
-            self.order.append(key)
-        super(OrderedCaseInsensitiveDict, self).__setitem__(key, value)
+        # the key keeps its first-seen case and position
+        key_lower = key.lower()
+        item = self._dict.get(key_lower)
+        if item is None:
+            if self._positions is not None:
+                self._positions[key_lower] = len(self._order)
+            self._order.append(key_lower)
+        else:
+            key = item[0]
+        self._dict[key_lower] = key, value
 
     def __delitem__(self, key):
-        raise NotImplementedError
+        key_lower = key.lower()
+        del self._dict[key_lower]
+        positions = self._positions
+        if positions is None:
+            positions = self._positions = dict(
+                (key_lower, index) for index, key_lower in enumerate(self._order)
+            )
+        self._order[positions.pop(key_lower)] = None
+        self._holes += 1
+        if self._holes > len(self._dict):
+            self._compact()
+
+    def _compact(self):
+        self._order = [key_lower for key_lower in self._order if key_lower is not None]
+        self._positions = None
+        self._holes = 0
+
+    def _get_order(self):
+        if self._holes:
+            self._compact()
+        return self._order
 
     def __iter__(self):
-        return iter(self.order)
-
-    def __deepcopy__(self, memo):
-        from copy import deepcopy
-        return OrderedCaseInsensitiveDict(
-            (key, deepcopy(value, memo)) for key, value in self.iteritems()
-        )
-
-    def iterkeys(self):
-        return iter(self.order)
+        d = self._dict
+        return (d[key_lower][0] for key_lower in self._get_order())
 
     def keys(self):
-        return self.order
+        d = self._dict
+        return [d[key_lower][0] for key_lower in self._get_order()]
 
     def itervalues(self):
-        for key in self.order:
-            yield self[key]
+        d = self._dict
+        return (d[key_lower][1] for key_lower in self._get_order())
 
     def values(self):
-        return [self[key] for key in self.order]
+        d = self._dict
+        return [d[key_lower][1] for key_lower in self._get_order()]
 
     def iteritems(self):
-        for key in self.order:
-            yield key, self[key]
+        d = self._dict
+        return (d[key_lower] for key_lower in self._get_order())
 
     def items(self):
-        return [(key, self[key]) for key in self.order]
+        d = self._dict
+        return [d[key_lower] for key_lower in self._get_order()]
 
 
 class CaseInsensitiveSet(set):
@@ -295,13 +553,13 @@ class CaseInsensitiveSet(set):
 
     def __init__(self, *args, **kwargs):
         initial_data = set(*args, **kwargs)
-        super(CaseInsensitiveSet, self).__init__(item.lower() for item in initial_data)
+        set.__init__(self, [item.lower() for item in initial_data])
 
     def __contains__(self, item):
-        return super(CaseInsensitiveSet, self).__contains__(item.lower())
+        return set.__contains__(self, item.lower())
 
     def add(self, item):
-        super(CaseInsensitiveSet, self).add(item.lower())
+        set.add(self, item.lower())
 
     def remove(self, item):
-        super(CaseInsensitiveSet, self).remove(item.lower())
+        set.remove(self, item.lower())